@@ -0,0 +1,268 @@
+#
+#  run.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+"""
+Benchmark harness. Generates synthetic inputs, times the individual stages
+(probing, profile resolution, process following, progress parsing) and
+whole pipelines per profile, and writes the results as JSON for comparison
+across commits and hosts. With --stubs, vspipe, ffmpeg and ffprobe are
+replaced by the stand-ins in stubs/ (see stub.py), so it also runs on
+machines without VapourSynth, SVP or even ffmpeg.
+"""
+
+import os, sys, json, time, shutil, asyncio, platform, tempfile, subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+STUBS_DIR = os.path.join(BENCH_DIR, 'stubs')
+RECORDINGS_DIR = os.path.join(BENCH_DIR, 'recordings')
+
+sys.path.insert(0, ROOT_DIR)
+
+def timed(fn, *args, repeat=1):
+    """
+    Calls `fn` `repeat` times and returns the last result and the mean time
+    per call in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+def make_input(workdir, source, size, duration, stubs):
+    w, h = (int(v) for v in size.split('x'))
+    if stubs:
+        path = os.path.join(workdir, '%s-%s.json' % (source, size))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'w': w, 'h': h, 'r': [24000, 1001], 'nf': int(duration * 24000 / 1001)}, f)
+        return path
+    path = os.path.join(workdir, '%s-%s.mkv' % (source, size))
+    subprocess.check_call([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', '%s=size=%s:rate=24000/1001' % (source, size),
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+        '-t', str(duration), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '48', '-c:a', 'aac', path
+    ])
+    return path
+
+def bench_probe(inputs, repeat):
+    from lib import ffprobe
+    results = []
+    for path in inputs:
+        info, uncached = timed(ffprobe.__wrapped__, path, repeat=repeat)
+        ffprobe(path)
+        _, cached = timed(ffprobe, path, repeat=repeat)
+        results.append({'input': os.path.basename(path), 'w': info['w'], 'h': info['h'], 'uncached': uncached, 'cached': cached})
+    return results
+
+def bench_profiles(repeat):
+    import yaml, interpolate
+
+    def resolve_all():
+        with open('profiles.yaml', 'rb') as f:
+            raw = yaml.safe_load(f)
+        return {name: interpolate.resolve_profile(raw, name) for name in raw}
+
+    profiles, uncached = timed(resolve_all, repeat=repeat)
+    interpolate.load_profiles()
+    _, cached = timed(interpolate.load_profiles, repeat=repeat)
+    return {'n': len(profiles), 'uncached': uncached, 'cached': cached}
+
+def line_writer(n_lines):
+    # Progress-like lines on stdout, log lines on stderr, written in bursts like ffmpeg does
+    return [sys.executable, '-c', (
+        'import sys\n'
+        'o, e = sys.stdout.buffer, sys.stderr.buffer\n'
+        'for i in range(%d):\n'
+        '    o.write(b"frame=%%d\\nfps=59.94\\nprogress=continue\\n" %% i)\n'
+        '    e.write(b"[libx264 @ 0x55d0c8a4a2c0] frame %%d\\r\\n" %% i)\n'
+        '    if i %% 64 == 0:\n'
+        '        o.flush(); e.flush()\n'
+    ) % (n_lines // 4)]
+
+def bench_follower(n_lines):
+    from lib import ProcessFollower, AsyncProcessFollower
+
+    def follow_sync():
+        p = subprocess.Popen(line_writer(n_lines), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        n = sum(1 for _ in ProcessFollower(p))
+        p.wait()
+        return n
+
+    async def follow_async():
+        p = subprocess.Popen(line_writer(n_lines), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        follower = AsyncProcessFollower()
+        await follower.follow(p)
+        n = 0
+        async for _ in follower:
+            n += 1
+        p.wait()
+        return n
+
+    def run_async():
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(follow_async())
+        finally:
+            loop.close()
+
+    n_sync, t_sync = timed(follow_sync)
+    n_async, t_async = timed(run_async)
+    return {
+        'sync': {'lines': n_sync, 's': t_sync, 'lps': int(n_sync / t_sync)},
+        'async': {'lines': n_async, 's': t_async, 'lps': int(n_async / t_async)}
+    }
+
+def bench_parse(n_lines):
+    from lib import ProgressParser
+
+    block = [b'frame=%d', b'fps=59.94', b'stream_0_0_q=28.0', b'bitrate=4992.1kbits/s', b'total_size=12641280',
+        b'out_time_us=83450000', b'out_time_ms=83450000', b'out_time=00:01:23.450000', b'dup_frames=0',
+        b'drop_frames=0', b'speed=0.998x', b'progress=continue']
+    lines = [line % i if b'%d' in line else line for i in range(n_lines // len(block)) for line in block]
+    parser = ProgressParser()
+    _, t_blocks = timed(lambda: [parser.feed(line) for line in lines])
+    return {
+        'ProgressParser': {'lines': len(lines), 's': t_blocks, 'lps': int(len(lines) / t_blocks)}
+    }
+
+def bench_pipeline(inputs, profiles, workdir, extra_args):
+    results = []
+    for path in inputs:
+        for profile in profiles:
+            output_file = os.path.join(workdir, 'out-%s.mkv' % profile)
+            cmd = [sys.executable, 'interpolate.py', path, output_file, '-p', profile] + extra_args
+            start = time.perf_counter()
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            first = None
+            last = {}
+            for line in p.stdout:
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                if 'f' in record:
+                    if first is None and record['f']:
+                        first = time.perf_counter() - start
+                    last = record
+                elif 'e' in record:
+                    last = record
+            p.wait()
+            elapsed = time.perf_counter() - start
+            result = {'input': os.path.basename(path), 'profile': profile, 'c': p.returncode, 's': elapsed, 'st': first}
+            if p.returncode == 0 and last.get('f'):
+                result['f'] = last['f']
+                result['fps'] = round(last['f'] / elapsed, 2)
+            elif 'e' in last:
+                result['e'] = last['e']
+            results.append(result)
+            if os.path.exists(output_file):
+                os.remove(output_file)
+    return results
+
+def record(workdir):
+    """
+    Replaces the recordings replayed by the stubs with the output of the
+    ffmpeg found on the PATH.
+    """
+    for flag, name in (('-codecs', 'ffmpeg-codecs.txt'), ('-hwaccels', 'ffmpeg-hwaccels.txt'), ('-version', 'ffmpeg-version.txt')):
+        with open(os.path.join(RECORDINGS_DIR, name), 'wb') as f:
+            f.write(subprocess.check_output(['ffmpeg', '-v', 'error', flag]))
+
+    path = make_input(workdir, 'testsrc2', '1920x1080', 4, False)
+    log = subprocess.run([
+        'ffmpeg', '-y', '-v', 'info', '-nostats', '-i', path, '-map', '0:v', '-map', '0:a',
+        '-c:v', 'libx264', '-x264-params', 'ssim=1', '-c:a', 'aac', os.path.join(workdir, 'out.mkv')
+    ], stderr=subprocess.PIPE, check=True).stderr.splitlines(True)
+    split = next((i for i, line in enumerate(log) if line.startswith(b'video:')), len(log))
+    with open(os.path.join(RECORDINGS_DIR, 'ffmpeg-start.txt'), 'wb') as f:
+        f.writelines(log[:split])
+    with open(os.path.join(RECORDINGS_DIR, 'ffmpeg-end.txt'), 'wb') as f:
+        f.writelines(log[split:])
+
+def host_info():
+    import interpolate
+    from lib import ffversion
+    info = {'p': sys.platform, 'py': platform.python_version(), 't': os.cpu_count()}
+    try:
+        info['c'] = interpolate.cpuinfo()
+    except Exception:
+        info['c'] = None
+    try:
+        info['ff'] = ffversion()
+    except (OSError, subprocess.CalledProcessError):
+        info['ff'] = None
+    try:
+        info['rev'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['rev'] = None
+    return info
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='dSVP benchmarks')
+    parser.add_argument('--stubs', action='store_true', default=False, help='use the stub vspipe, ffmpeg and ffprobe instead of the real ones')
+    parser.add_argument('--record', action='store_true', default=False, help='re-record the output replayed by the stubs from the local ffmpeg and exit')
+    parser.add_argument('--sources', default='testsrc2,mandelbrot', help='lavfi sources of the synthetic inputs')
+    parser.add_argument('--sizes', default='640x360,1920x1080', help='frame sizes of the synthetic inputs')
+    parser.add_argument('--duration', type=float, default=4, help='length of the synthetic inputs in seconds')
+    parser.add_argument('--profiles', default='default,anime', help='profiles to run end-to-end')
+    parser.add_argument('--stages', default='probe,profiles,follower,parse,pipeline', help='stages to run')
+    parser.add_argument('--repeat', type=int, default=20, help='repetitions of the probe and profile stages')
+    parser.add_argument('--lines', type=int, default=200000, help='number of lines for the follower and parser stages')
+    parser.add_argument('-o', '--output', help='write the results to this file instead of stdout')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='extra arguments for interpolate.py, after --')
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    workdir = tempfile.mkdtemp(prefix='dsvp-bench-')
+    # Keep the benchmark's probe, profile and index caches away from the user's
+    os.environ['DSVP_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    if args.stubs:
+        os.environ['PATH'] = STUBS_DIR + os.pathsep + os.environ.get('PATH', '')
+
+    try:
+        if args.record:
+            record(workdir)
+            return 0
+
+        stages = set(args.stages.split(','))
+        results = {'host': host_info(), 'stubs': args.stubs, 'stages': {}}
+        inputs = []
+        if len(stages & {'probe', 'pipeline'}) > 0:
+            for source in args.sources.split(','):
+                for size in args.sizes.split(','):
+                    path, t = timed(make_input, workdir, source, size, args.duration, args.stubs)
+                    inputs.append(path)
+        if 'probe' in stages:
+            results['stages']['probe'] = bench_probe(inputs, args.repeat)
+        if 'profiles' in stages:
+            results['stages']['profiles'] = bench_profiles(args.repeat)
+        if 'follower' in stages:
+            results['stages']['follower'] = bench_follower(args.lines)
+        if 'parse' in stages:
+            results['stages']['parse'] = bench_parse(args.lines)
+        if 'pipeline' in stages:
+            extra_args = [a for a in args.args if a != '--']
+            results['stages']['pipeline'] = bench_pipeline(inputs, args.profiles.split(','), workdir, extra_args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    data = json.dumps(results, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#
+#  stub.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+"""
+Stand-ins for vspipe, ffmpeg and ffprobe which let the benchmarks run the
+whole pipeline on machines without VapourSynth, SVP or ffmpeg. Inputs are
+small JSON files describing a clip ({"w", "h", "r": [num, den], "nf"} and
+optionally "hold", the number of times each drawing is repeated).
+The stub vspipe writes the interpolated clip as Y4M at DSVP_BENCH_VS_FPS
+frames per second, the stub ffmpeg consumes it (at most DSVP_BENCH_FF_FPS
+frames per second if set) while writing progress blocks and the log lines
+recorded in recordings/, and the stub ffprobe describes the input file.
+With DSVP_BENCH_VS_FAIL set, vspipe fails after that many frames.
+"""
+
+import os, sys, json, time
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+OUTPUT_RATE = (60, 1)
+
+def recording(name):
+    with open(os.path.join(RECORDINGS, name), 'rb') as f:
+        return f.read()
+
+def load_clip(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class Pacer(object):
+    def __init__(self, fps):
+        self.__interval = 1 / fps if fps > 0 else 0
+        self.__next = time.monotonic()
+
+    def wait(self):
+        if self.__interval == 0:
+            return
+        self.__next += self.__interval
+        delay = self.__next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+def vspipe(args):
+    source = None
+    for i, arg in enumerate(args):
+        if arg == '--arg' and args[i + 1].startswith('source='):
+            source = args[i + 1][7:]
+    clip = load_clip(source)
+    n_frames = clip['nf'] * OUTPUT_RATE[0] * clip['r'][1] // (OUTPUT_RATE[1] * clip['r'][0])
+    frame = b'FRAME\n' + bytes(clip['w'] * clip['h'] * 3 // 2)
+
+    out = sys.stdout.buffer
+    pacer = Pacer(float(os.environ.get('DSVP_BENCH_VS_FPS', '240')))
+    fail = int(os.environ.get('DSVP_BENCH_VS_FAIL', '-1'))
+    start = time.monotonic()
+    try:
+        out.write(b'YUV4MPEG2 W%d H%d F%d:%d Ip A0:0 C420jpeg XYSCSS=420JPEG\n' % (clip['w'], clip['h'], OUTPUT_RATE[0], OUTPUT_RATE[1]))
+        for n in range(n_frames):
+            if n == fail:
+                out.flush()
+                sys.stderr.write('Error: Failed to retrieve frame %d with error: simulated failure\n' % n)
+                return 1
+            out.write(frame)
+            pacer.wait()
+        out.flush()
+    except BrokenPipeError:
+        return 1
+    elapsed = time.monotonic() - start
+    sys.stderr.write('Output %d frames in %.2f seconds (%.2f fps)\n' % (n_frames, elapsed, n_frames / elapsed if elapsed > 0 else 0))
+    return 0
+
+def read_y4m_frames(f):
+    header = f.readline().split()
+    width = int(next(h[1:] for h in header if h.startswith(b'W')))
+    height = int(next(h[1:] for h in header if h.startswith(b'H')))
+    size = width * height * 3 // 2
+    while True:
+        if len(f.readline()) == 0:
+            return
+        remaining = size
+        while remaining > 0:
+            b = f.read(min(remaining, 1 << 20))
+            if len(b) == 0:
+                return
+            remaining -= len(b)
+        yield
+
+def ffmpeg(args):
+    for flag, name in (('-codecs', 'ffmpeg-codecs.txt'), ('-hwaccels', 'ffmpeg-hwaccels.txt'), ('-version', 'ffmpeg-version.txt')):
+        if flag in args:
+            sys.stdout.buffer.write(recording(name))
+            return 0
+    if any('signalstats.YMAX' in arg for arg in args): # Duplicate frame pre-pass
+        write_frame_stats(load_clip(args[args.index('-i') + 1]))
+        return 0
+    if '-progress' not in args: # Concatenation, or analysis runs which produce no metadata here
+        if args[-1] != '-':
+            with open(args[-1], 'wb'):
+                pass
+        return 0
+
+    out = sys.stdout.buffer
+    err = sys.stderr.buffer
+    err.write(recording('ffmpeg-start.txt'))
+    err.flush()
+
+    sources = [args[i + 1] for i, arg in enumerate(args) if arg == '-i']
+    if sources[0] in ('pipe:', '-'):
+        frames = read_y4m_frames(sys.stdin.buffer)
+    elif sources[0].endswith('.y4m'): # Calibration sample
+        frames = read_y4m_frames(open(sources[0], 'rb'))
+    else: # Passthrough reads the input file directly
+        clip = load_clip(sources[0])
+        frames = iter(range(clip['nf']))
+
+    pacer = Pacer(float(os.environ.get('DSVP_BENCH_FF_FPS', '0')))
+    start = time.monotonic()
+    n = 0
+    last = 0
+    for _ in frames:
+        n += 1
+        pacer.wait()
+        now = time.monotonic()
+        if now - last >= 0.5:
+            last = now
+            write_progress(out, n, now - start, 'continue')
+    write_progress(out, n, time.monotonic() - start, 'end')
+
+    # The last argument of each output block is its file
+    with open(args[-1], 'wb') as f:
+        f.truncate(int(n * OUTPUT_RATE[1] / OUTPUT_RATE[0] * 624000))
+    err.write(recording('ffmpeg-end.txt'))
+    return 0
+
+def write_progress(out, n, elapsed, state):
+    t = n * OUTPUT_RATE[1] / OUTPUT_RATE[0]
+    block = (
+        'frame=%d\nfps=%.2f\nstream_0_0_q=28.0\nbitrate=4992.0kbits/s\ntotal_size=%d\n'
+        'out_time_us=%d\nout_time_ms=%d\nout_time=00:00:%09.6f\ndup_frames=0\ndrop_frames=0\n'
+        'speed=%.3gx\nprogress=%s\n'
+    ) % (n, n / elapsed if elapsed > 0 else 0, int(t * 624000), int(t * 1e6), int(t * 1e6), t, t / elapsed if elapsed > 0 else 0, state)
+    out.write(block.encode('ascii'))
+    out.flush()
+
+def write_frame_stats(clip):
+    hold = clip.get('hold', 1)
+    for n in range(1, clip['nf']):
+        moved = n % hold == 0
+        sys.stderr.write(
+            '[Parsed_metadata_4 @ 0x55d0c8a4a2c0] lavfi.signalstats.YAVG=%s\n'
+            '[Parsed_metadata_5 @ 0x55d0c8a4a2c0] lavfi.signalstats.YMAX=%d\n' % ('4.2' if moved else '0.1', 96 if moved else 3))
+
+def ffprobe(args):
+    clip = load_clip(args[-1])
+    if '-show_streams' in args:
+        sys.stdout.write(
+            '[STREAM]\nindex=0\ncodec_name=h264\ncodec_type=video\nwidth=%d\nheight=%d\npix_fmt=yuv420p\n'
+            'r_frame_rate=%d/%d\navg_frame_rate=%d/%d\nstart_time=0.000000\nduration=%.6f\nbits_per_raw_sample=8\nnb_frames=%d\n[/STREAM]\n'
+            % (clip['w'], clip['h'], clip['r'][0], clip['r'][1], clip['r'][0], clip['r'][1], clip['nf'] * clip['r'][1] / clip['r'][0], clip['nf']))
+    else: # Keyframe listing, one keyframe every two seconds
+        gop = 2 * clip['r'][0] // clip['r'][1]
+        for n in range(0, clip['nf'], gop):
+            sys.stdout.write('%.6f,K_\n' % (n * clip['r'][1] / clip['r'][0]))
+    return 0
+
+def main(name, args):
+    return {'vspipe': vspipe, 'ffmpeg': ffmpeg, 'ffprobe': ffprobe}[name](args)
@@ -0,0 +1,12 @@
+#
+#  conftest.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+# Nothing to configure: its mere presence makes pytest put the repository
+# root on sys.path, so that the tests find lib however pytest is started
@@ -9,10 +9,13 @@
 #  Licensed under the EUPL
 #
 
-import sys, json
+import sys, json, threading
+
+PRINT_LOCK = threading.Lock()
 
 def printj(v):
-    print(json.dumps(v, separators=(',',':')))
+    with PRINT_LOCK:
+        print(json.dumps(v, separators=(',',':')))
 
 def merge(source, dest):
     for key, value in source.items():
@@ -20,23 +23,36 @@ def merge(source, dest):
     return dest
 
 def resolve_profile(profiles, profile_name, override=None):
+    from lib import compile_profile
+    if override is None and 'compiled' in profiles[profile_name]: # Resolved by load_profiles()
+        return profiles[profile_name]
     result = merge(profiles['default'], {})
     if profile_name != 'default':
         merge(profiles[profile_name], result)
     if override is not None:
         merge(override, result)
-    return result
+    return compile_profile(result)
 
 def load_profiles():
-    import yaml
-    with open('profiles.yaml', 'rb') as f:
-        return yaml.safe_load(f)
+    from lib import PROFILE_CACHE, PROFILE_FORMAT, file_key
+    key = '%d|%s' % (PROFILE_FORMAT, file_key('profiles.yaml'))
+    profiles = PROFILE_CACHE.get(key)
+    if profiles is None:
+        import yaml
+        with open('profiles.yaml', 'rb') as f:
+            raw = yaml.safe_load(f)
+        profiles = {name: resolve_profile(raw, name) for name in raw}
+        PROFILE_CACHE.put(key, profiles)
+    return profiles
 
-def load_vapoursynth():
+def load_vapoursynth(threads=None, cache=None):
     import vapoursynth as vs
 
     core = vs.core
-    core.num_threads = 0
+    if threads is not None:
+        core.num_threads = threads
+    if cache is not None:
+        core.max_cache_size = cache
 
     assert hasattr(vs.core, 'ffms2')
     assert hasattr(vs.core, 'svp1')
@@ -44,67 +60,1017 @@ def load_vapoursynth():
 
     return vs, core
 
-def main(config):
-    import os, re
+def build_graph(vs, core, source, analyse_config, smooth_config, gpu=False, first=None, last=None, overlap=0, mvcache=None, index_cache=None, decoder=None, dedup=None):
+    if decoder in ('ffmpeg', 'vaapi'): # Decoded by a separate ffmpeg process
+        from lib import ffprobe, pipe_source
+        clip = pipe_source(vs, core, source, ffprobe(source), decoder)
+    elif index_cache is not None:
+        from lib import ffms2_source
+        clip = ffms2_source(core, source, index_cache[0], index_cache[1])
+    else:
+        clip = core.ffms2.Source(source=source)
+    clip = clip.resize.Bicubic(format=vs.YUV420P8)
 
-    if '' not in sys.path: # Hack for portable python
-        sys.path.insert(0, '')
+    dup = None
+    if dedup is not None: # Runs of duplicates found by the pre-pass of the main process
+        from lib import frame_map
+        dup = frame_map(dedup, clip.num_frames)
+
+    if first is not None: # Segment with some overlap for the motion vectors
+        last = clip.num_frames if last is None else min(last, clip.num_frames)
+        start = max(0, first - overlap)
+        clip = clip[start:min(last + overlap, clip.num_frames)]
+        if dup is not None:
+            dup = dup[start:(start + clip.num_frames)]
 
+    svp_super = core.svp1.Super(clip, '{gpu:1}' if gpu else '{gpu:0}')
+    svp_vectors = core.svp1.Analyse(svp_super['clip'], svp_super['data'], clip, analyse_config)
+    vectors_clip = svp_vectors['clip']
+    if mvcache is not None: # Only the vector frames are costly, Analyse's data is cheap to rebuild
+        from lib import VectorStore
+        store = VectorStore(mvcache)
+        vectors_clip = store.load(vs, core) if store.available() else store.record(vs, core, vectors_clip)
+    svp_smooth = core.svp2.SmoothFps(clip, svp_super['clip'], svp_super['data'], vectors_clip, svp_vectors['data'], smooth_config)
+    svp_smooth = core.std.AssumeFPS(svp_smooth, fpsnum=svp_smooth.fps_num, fpsden=svp_smooth.fps_den)
+    if dup is not None:
+        from lib import hold_static
+        svp_smooth = hold_static(core, clip, svp_smooth, dup)
+
+    if first is not None: # Cut the overlap off again, rounding on the global frame grid so segments line up
+        from fractions import Fraction
+        ratio = Fraction(svp_smooth.fps_num, svp_smooth.fps_den) / Fraction(clip.fps_num, clip.fps_den)
+        out_frame = lambda n: int(n * ratio + Fraction(1, 2))
+        svp_smooth = svp_smooth[(out_frame(first) - out_frame(start)):min(out_frame(last) - out_frame(start), svp_smooth.num_frames)]
+
+    return svp_smooth
+
+def start_pipeline(config, output_file, nvenc, segment=None, overlap=0, cpus=None, **kwargs):
     from subprocess import PIPE
-    from lib import ProcessFollower, vspipe, ffprobe, ffvcodecs, ffmpeg, parse_progress
+    from lib import vspipe, ffmpeg, vectors_key, VSFrameWriter, rawvideo_options, plan_threads, pinned
 
-    try:
-        info = ffprobe(config.input_file)
-    except:
-        printj({'e': 'invalid_file'})
-        sys.exit(1)
+    first, last = segment if segment is not None else (None, None)
+    compiled = config.profile['compiled']
+    mvcache = None
+    if config.mv_cache and config.dedup is None: # Held frames are never requested, so the store would never be complete
+        start = max(0, first - overlap) if first is not None else None
+        end = last + overlap if last is not None else None
+        mvcache = vectors_key(config.input_file, compiled['analyse'], config.gpu, config.decoder, start, end)
 
-    info['nft'] = int(info['d'] * 60 + 0.5)
+    index_cache = index_cache_args(config)
 
-    h264_encoders = ffvcodecs()['h264'][1]
-    if config.gpu and 'h264_nvenc' in h264_encoders:
-        nvenc = True
-    elif 'libx264' in h264_encoders:
-        nvenc = False
+    vs_cpus, ff_cpus = None, None
+    if cpus is None:
+        cpus = config.cpus
+    if cpus is not None:
+        vs_cpus, ff_cpus = plan_threads(cpus, config.vs_share)
+        if not nvenc:
+            kwargs['threads'] = len(ff_cpus)
+
+    cache = None
+    plan = config.memory_plan
+    if plan is not None:
+        cache = plan['cache']
+        kwargs['queue_size'] = plan['queue']
+        kwargs['lookahead'] = plan['la']
+
+    if config.engine == 'inproc': # The core and its cache are shared by all pipelines of this process
+        vs, core = load_vapoursynth(cache=config.core_cache)
+        clip = build_graph(vs, core, config.input_file, compiled['analyse'], compiled['smooth'], config.gpu, first, last, overlap, mvcache, index_cache, config.decoder, config.dedup_runs)
+        with pinned(ff_cpus):
+            p2 = ffmpeg(config.input_file, output_file, config.profile, config.logo, config.subtitles, nvenc, input_options=rawvideo_options(clip), stdin=PIPE, stdout=PIPE, stderr=PIPE, **kwargs)
+        p1 = VSFrameWriter(clip, p2.stdin, config.prefetch)
+        p1.start()
     else:
-        printj({'e': 'no_encoder'})
-        sys.exit(1)
+        with pinned(vs_cpus):
+            p1 = vspipe(config, segment, overlap, mvcache, index_cache, len(vs_cpus) if vs_cpus is not None else None, cache, stdout=PIPE, stderr=PIPE)
+        with pinned(ff_cpus):
+            p2 = ffmpeg(config.input_file, output_file, config.profile, config.logo, config.subtitles, nvenc, stdin=p1.stdout, stdout=PIPE, stderr=PIPE, **kwargs)
+        p1.stdout.close()
+    return p1, p2
+
+def index_cache_args(config):
+    if config.index_cache == '':
+        return None
+    return (config.index_cache, int(config.index_cache_size * 1024**3))
 
-    NUL = open(os.devnull, 'w')
-    p1 = vspipe(config, stdout=PIPE, stderr=NUL)
-    p2 = ffmpeg(config.input_file, config.output_file, config.profile, config.logo, config.subtitles, nvenc, stdin=p1.stdout, stdout=PIPE, stderr=PIPE)
-    p1.stdout.close()
+def calibrate(config, info, nvenc):
+    """
+    Returns the fraction of a job's CPU time spent in VapourSynth, measured by
+    interpolating a short sample of the input and piping it into the encoder.
+    Results are cached per CPU model, profile and encoder.
+    """
+    import os, json, shutil, tempfile
+    from subprocess import PIPE, DEVNULL
+    from lib import vspipe, ffmpeg, encoder_params, wait_timed, CALIBRATION_CACHE
+
+    compiled = config.profile['compiled']
+    key = json.dumps([cpuinfo(), compiled['analyse'], compiled['smooth'], config.gpu, nvenc, encoder_params(config.profile, nvenc), config.dedup])
+    vs_share = CALIBRATION_CACHE.get(key)
+    if vs_share is not None:
+        return vs_share
+
+    workdir = tempfile.mkdtemp(prefix='.dsvp-', dir=os.path.dirname(os.path.abspath(config.output_file)) if config.output_file is not None else None)
+    try:
+        # Untimed single frame first, so that indexing the input is not counted as interpolation
+        index_cache = index_cache_args(config)
+        vspipe(config, (0, 1), 0, None, index_cache, stdout=DEVNULL, stderr=DEVNULL).wait()
+        # Both run side by side as in a real pipeline, each timed by its own CPU time
+        p1 = vspipe(config, (0, min(CALIBRATION_FRAMES, int(info['nf']))), 0, None, index_cache, stdout=PIPE, stderr=DEVNULL)
+        p2 = ffmpeg(config.input_file, os.path.join(workdir, 'sample.mkv'), config.profile, nvenc=nvenc, audio=False, stdin=p1.stdout, stdout=DEVNULL, stderr=DEVNULL)
+        p1.stdout.close()
+        vs_time = wait_timed(p1)
+        ff_time = wait_timed(p2)
+        if p1.returncode != 0 or p2.returncode != 0 or vs_time + ff_time <= 0:
+            return 0.5
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
 
-    progress = None
+    vs_share = round(vs_time / (vs_time + ff_time), 3)
+    CALIBRATION_CACHE.put(key, vs_share)
+    return vs_share
 
+def plan_resources(config, info, nvenc, pipelines=1, emit=printj, shared=None):
+    """
+    Decides on the CPU split and the memory settings of the pipelines of a
+    job. `shared` is the number of pipelines which may run at once in this
+    process, and so share the core of the inproc engine, if that is more
+    than the job's own. Returns False (after emitting an error) if the job
+    cannot be run within its memory budget.
+    """
+    import os
+    from lib import plan_threads, plan_memory, frame_bytes, split_cpus, reader_window
+
+    config.memory_plan = None
+    config.core_cache = None
+    if passthrough_mode(config, info) is not None and config.preview == 0:
+        return True
+
+    cpus = None
+    if config.cpus is not None:
+        if config.vs_share is None:
+            config.vs_share = calibrate(config, info, nvenc)
+            emit({'cal': config.vs_share})
+        cpus = split_cpus(config.cpus, pipelines)[0]
+
+    if config.memory_budget is None:
+        return True
+    if info.get('w') is None or info.get('h') is None:
+        emit({'e': 'invalid_file'})
+        return False
+
+    if cpus is not None:
+        vs_cpus, ff_cpus = plan_threads(cpus, config.vs_share)
+        vs_threads, x264_threads = len(vs_cpus), len(ff_cpus)
+    else: # Both default to all cores, x264 even to 1.5 threads per core
+        vs_threads = os.cpu_count() or 1
+        x264_threads = vs_threads * 3 // 2
+    encoders = []
+    for profile in [config.profile] + [profile for _, profile in config.renditions]:
+        if nvenc: # Frames live on the GPU, only a few surfaces are mapped
+            encoders.append((2, 0, 0))
+        else:
+            x264 = profile['x264']
+            encoders.append((x264_threads, x264.get('rc-lookahead', 40), x264.get('bframes', 3) + x264.get('ref', 3)))
+
+    reader = reader_window() if config.decoder in ('ffmpeg', 'vaapi') else 0 # pipe_source() keeps YUV420P8 frames
+    plan = plan_memory(config.memory_budget // pipelines, frame_bytes(info['w'], info['h']), vs_threads, encoders, reader=reader)
+    if plan is None:
+        emit({'e': 'memory_budget'})
+        return False
+    config.memory_plan = plan
+    config.core_cache = plan['cache'] * (shared or pipelines)
+    emit({'mem': plan})
+    return True
+
+def run_async(coro):
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+async def follow(proc, callback, source=None, on_line=None):
+    import asyncio
+    from subprocess import Popen
+    from lib import AsyncProcessFollower, ProgressParser
+
+    follower = AsyncProcessFollower()
+    await follower.follow(proc)
+    if isinstance(source, Popen):
+        await follower.follow(source)
+
+    parser = ProgressParser()
     last_lines = []
+    source_lines = []
     try:
         last = None
-        for stderr, data in ProcessFollower(p2):
+        async for p, stderr, data in follower:
+            if p is not proc:
+                source_lines.append(data)
+                if len(source_lines) == 6:
+                    del source_lines[0]
+                continue
+
+            if not stderr: # -progress channel
+                progress = parser.feed(data)
+                if progress is not None:
+                    callback(progress)
+                continue
+
+            if on_line is not None:
+                on_line(data)
             if last is not None and data == last:
                 continue
             last = data
             last_lines.append(data)
             if len(last_lines) == 6:
                 del last_lines[0]
-
-            progress = parse_progress(data)
-            if progress is not None:
-                info.update(progress)
-                printj(info)
     except:
-        p2.terminate()
-        p2.wait()
+        proc.terminate()
+        proc.wait()
         raise
 
-    if p2.returncode != 0:
-        printj({'e': 'fail', 'c': p2.returncode, 'm': [l.decode('utf-8') for l in last_lines]})
-    return p2.returncode
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, proc.wait)
+    if source is not None:
+        await loop.run_in_executor(None, source.wait)
+    return last_lines, source_lines
+
+def report_failure(returncode, last_lines, source_lines=[], emit=printj, source=None, **kwargs):
+    record = {'e': 'fail', 'c': returncode, 'm': [l.decode('utf-8') for l in last_lines]}
+    vm = [l.decode('utf-8', 'replace') for l in source_lines]
+    if getattr(source, 'error', None) is not None: # Raised by the graph inside the inproc engine
+        vm.append(str(source.error))
+    if len(vm) > 0:
+        record['vm'] = vm
+    record.update(kwargs)
+    emit(record)
+
+def pipeline_returncode(p1, p2):
+    """
+    Returns the exit code of a finished pipeline. A VapourSynth side failing
+    mid-stream looks like a regular end of input to ffmpeg, so its status
+    counts as well.
+    """
+    if p2.returncode != 0 or p1 is None:
+        return p2.returncode
+    return p1.returncode
+
+def probe_input(input_file):
+    from lib import ffprobe
+    info = ffprobe(input_file)
+    info['nft'] = int(info['d'] * 60 + 0.5)
+    return info
+
+def tune_profiles(config, info, emit=printj):
+    """
+    Replaces profiles with an `auto` section (the job's and those of its
+    renditions) by versions tuned to the probed input. The job's override is
+    applied again on top, so explicit settings always win.
+    """
+    from lib import ffmotion, auto_settings, compile_profile
+
+    profiles = [config.profile] + [profile for _, profile in config.renditions]
+    if not any('auto' in profile for profile in profiles) or info.get('w') is None:
+        return
+    try:
+        motion = ffmotion(config.input_file, info['d'])
+    except:
+        motion = None
+
+    def tune(profile):
+        if 'auto' not in profile:
+            return profile
+        settings = auto_settings(profile['auto'], info, motion)
+        result = merge(settings, merge(profile, {}))
+        if config.override is not None:
+            merge(config.override, result)
+        return compile_profile(result)
+
+    config.profile = tune(config.profile)
+    config.renditions = [(fn, tune(profile)) for fn, profile in config.renditions]
+    emit({'auto': {'mo': motion, 'analyse': config.profile['analyse']}})
+
+def choose_decoder(config, info, emit=printj):
+    """
+    Resolves the job's --decoder choice for the probed input, falling back
+    to software decoding where the requested hwaccel is not available.
+    """
+    from lib import ffhwaccels, select_decoder
+
+    if config.decoder == 'ffms2':
+        return
+    try:
+        hwaccels = ffhwaccels()
+    except:
+        hwaccels = []
+    config.decoder = select_decoder(config.decoder, config.input_file, info, hwaccels)
+    emit({'dec': config.decoder})
+
+def plan_dedup(config, info, emit=printj):
+    """
+    Runs the duplicate frame pre-pass if the job's profile has a `dedup`
+    section and reports the share of source frames repeating their
+    predecessor (`dup`) and of output frames shown as they are instead of
+    being interpolated (`sk`). The runs of duplicates are kept for the
+    inproc engine and written to a temporary file for vspipe, which
+    discard_dedup() removes again.
+    """
+    import os, json, tempfile
+    from fractions import Fraction
+    from lib import ffdupes, frame_map, held_fraction
+
+    config.dedup = None
+    config.dedup_runs = None
+    config.dedup_file = None
+    settings = config.profile.get('dedup')
+    if settings is None or info.get('nf') is None or info['r'] is None or passthrough_mode(config, info) is not None:
+        return
+    if config.preview > 0: # A scan of the whole input would take longer than the preview itself
+        return
+    thresholds = (float(settings.get('avg', 0.5)), float(settings.get('max', 10)))
+    try:
+        runs = ffdupes(config.input_file, *thresholds)
+        fd, dedup_file = tempfile.mkstemp(prefix='.dsvp-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(runs, f)
+    except:
+        return
+    dup = frame_map(runs, int(info['nf']))
+    rate = config.profile['smooth'].get('rate', {})
+    ratio = Fraction(rate.get('num', 2), rate.get('den', 1))
+    if rate.get('abs', False):
+        ratio /= Fraction(*info['r'])
+    config.dedup = thresholds
+    config.dedup_runs = runs
+    config.dedup_file = dedup_file
+    emit({'dedup': {
+        'dup': round(sum(dup) / len(dup), 3) if len(dup) > 0 else 0.0,
+        'sk': round(held_fraction(dup, ratio.numerator, ratio.denominator), 3)
+    }})
+
+def discard_dedup(config):
+    import os
+    if getattr(config, 'dedup_file', None) is not None:
+        try:
+            os.remove(config.dedup_file)
+        except OSError:
+            pass
+        config.dedup_file = None
+
+CALIBRATION_FRAMES = 48
+
+def select_encoder(gpu, vcodecs):
+    h264_encoders = vcodecs['h264'][1]
+    if gpu and 'h264_nvenc' in h264_encoders:
+        return True
+    elif 'libx264' in h264_encoders:
+        return False
+    else:
+        return None
+
+def passthrough_mode(config, info):
+    if not config.passthrough:
+        return None
+    rate = config.profile['smooth'].get('rate', {})
+    if not rate.get('abs', False) or info['r'] is None or info['r'][1] == 0:
+        return None
+    if info.get('vfr', True): # r_frame_rate is merely the finest rate of such streams
+        return None
+    if info['r'][0] * rate.get('den', 1) * 100 < info['r'][1] * rate['num'] * 99: # Allow for NTSC rates
+        return None
+    if config.logo is None and config.subtitles is None and len(config.renditions) == 0 and config.stream is None and info.get('c') == 'h264' and info.get('pf') == 'yuv420p':
+        return 'copy' # Only if the stream is what the encoder would have made of it
+    return 'decode'
+
+async def run_pipeline(config, info, nvenc, emit=printj):
+    import os, asyncio, functools
+    from subprocess import PIPE, Popen
+    from lib import ffmpeg, ffremux, ProgressReporter, PipelineTelemetry, SegmentTracker, proc_rss
+
+    stream = {'stream': config.stream, 'segment_time': config.stream_segment}
+    if config.stream == 'hls':
+        for output_file in [config.output_file] + [fn for fn, _ in config.renditions]:
+            os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+
+    mode = passthrough_mode(config, info)
+    if mode is not None: # Already at the target frame rate, no need for SVP
+        info['pt'] = mode
+        info['nft'] = int(info['nf'])
+        p1 = None
+        if mode == 'copy':
+            p2 = ffremux(config.input_file, config.output_file, config.profile, stdout=PIPE, stderr=PIPE)
+        else:
+            p2 = ffmpeg(config.input_file, config.output_file, config.profile, config.logo, config.subtitles, nvenc, renditions=config.renditions, source=config.input_file, stdout=PIPE, stderr=PIPE, **stream)
+    else:
+        # Building the graph may index the input, which must not stall other jobs on this loop
+        start = asyncio.get_event_loop().run_in_executor(None, functools.partial(start_pipeline, config, config.output_file, nvenc, renditions=config.renditions, **stream))
+        try:
+            p1, p2 = await asyncio.shield(start)
+        except asyncio.CancelledError:
+            p1, p2 = await start
+            p2.terminate()
+            p2.wait()
+            raise
+
+    telemetry = None
+    if config.telemetry > 0 and p1 is not None:
+        telemetry = PipelineTelemetry(p1, p2, emit, config.telemetry)
+        telemetry.start()
+
+    reporter = ProgressReporter(info, emit, config.progress_interval)
+    update = reporter.update
+    if config.memory_budget is not None:
+        pids = [p2.pid] + ([p1.pid if isinstance(p1, Popen) else os.getpid()] if p1 is not None else [])
+        peak_rss = [0]
+        def update(progress):
+            rss = proc_rss(pids)
+            if rss is not None:
+                peak_rss[0] = max(peak_rss[0], rss)
+                progress = dict(progress, rss=rss, prss=peak_rss[0])
+            reporter.update(progress)
+
+    tracker = None
+    if config.stream == 'hls':
+        tracker = SegmentTracker()
+        def published(data):
+            for fn in tracker.feed(data):
+                emit({'seg': os.path.basename(fn), 'f': info.get('f')})
+    try:
+        last_lines, source_lines = await follow(p2, update, p1, published if tracker is not None else None)
+    finally:
+        if telemetry is not None:
+            telemetry.stop()
+    reporter.flush()
+
+    returncode = pipeline_returncode(p1, p2)
+    if returncode != 0:
+        report_failure(returncode, last_lines, source_lines, emit, p1)
+    elif tracker is not None:
+        for fn in tracker.finish():
+            emit({'seg': os.path.basename(fn), 'f': info.get('f')})
+    return returncode
+
+def main(config):
+    if '' not in sys.path: # Hack for portable python
+        sys.path.insert(0, '')
+
+    from lib import ffvcodecs
+
+    try:
+        info = probe_input(config.input_file)
+    except:
+        printj({'e': 'invalid_file'})
+        sys.exit(1)
+
+    nvenc = select_encoder(config.gpu, ffvcodecs())
+    if nvenc is None:
+        printj({'e': 'no_encoder'})
+        sys.exit(1)
+
+    choose_decoder(config, info)
+    tune_profiles(config, info)
+    plan_dedup(config, info)
+    try:
+        segmented = (config.jobs > 1 or config.resume) and config.stream is None and passthrough_mode(config, info) is None
+        if not plan_resources(config, info, nvenc, config.jobs if segmented or config.preview > 0 else 1):
+            sys.exit(1)
+        if config.preview > 0:
+            return main_preview(config, info, nvenc)
+
+        cache, key = output_cache(config, nvenc)
+        if key is not None and cache.fetch(key, job_outputs(config)):
+            printj(dict(info, f=info['nft'], oc=1))
+            return 0
+
+        if segmented:
+            returncode = main_segmented(config, info, nvenc)
+        else:
+            returncode = run_async(run_pipeline(config, info, nvenc))
+        if returncode == 0 and key is not None:
+            cache.store(key, job_outputs(config))
+        return returncode
+    finally:
+        discard_dedup(config)
+
+def job_outputs(config):
+    return [config.output_file] + [fn for fn, _ in config.renditions]
+
+def output_cache(config, nvenc):
+    """
+    Returns the output cache and the key of the given job's results, or
+    (None, None) if the job's results are not to be cached.
+    """
+    import os
+    from lib import OutputCache, fingerprint, ffversion
+
+    if not config.output_cache or config.stream == 'hls':
+        return None, None
+    try:
+        key = [
+            fingerprint(config.input_file),
+            config.profile,
+            [profile for _, profile in config.renditions],
+            [os.path.splitext(fn)[1] for fn in job_outputs(config)],
+            fingerprint(config.logo) if config.logo is not None else None,
+            fingerprint(config.subtitles) if config.subtitles is not None else None,
+            config.gpu, nvenc, config.passthrough, config.stream, config.decoder, config.dedup,
+            config.memory_plan['la'] if config.memory_plan is not None else None,
+            ffversion()
+        ]
+    except OSError:
+        return None, None
+    cache = OutputCache(config.output_cache_dir, int(config.output_cache_size * 1024**3))
+    return cache, cache.key(key)
+
+def make_job(config, profiles, entry):
+    import argparse
+
+    job = argparse.Namespace(**vars(config))
+    job.input_file = entry['input']
+    job.output_file = entry['output']
+    job.logo = entry.get('logo', config.logo)
+    job.subtitles = job.input_file if entry.get('inline_subtitles', False) else entry.get('subtitles', config.subtitles)
+    job.gpu = entry.get('gpu', config.gpu)
+    job.override = entry.get('override')
+    job.profile = resolve_profile(profiles, entry.get('profile', 'default'), entry.get('override'))
+    job.renditions = [(r['output'], resolve_profile(profiles, r.get('profile', 'default'), entry.get('override'))) for r in entry.get('renditions', [])]
+    return job
+
+async def run_job(job, vcodecs, slots, emit, probe=probe_input):
+    import asyncio
+
+    nvenc = select_encoder(job.gpu, vcodecs)
+    if nvenc is None:
+        emit({'e': 'no_encoder'})
+        return 1
+
+    async with slots[nvenc].take() as cpus:
+        job.cpus = cpus
+        try:
+            info = await asyncio.get_event_loop().run_in_executor(None, probe, job.input_file)
+        except:
+            emit({'e': 'invalid_file'})
+            return 1
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, choose_decoder, job, info, emit)
+        await loop.run_in_executor(None, tune_profiles, job, info, emit)
+        await loop.run_in_executor(None, plan_dedup, job, info, emit)
+        try:
+            if not await loop.run_in_executor(None, plan_resources, job, info, nvenc, 1, emit, job.cpu_jobs + job.gpu_jobs):
+                return 1
+
+            cache, key = await loop.run_in_executor(None, output_cache, job, nvenc)
+            if key is not None and await loop.run_in_executor(None, cache.fetch, key, job_outputs(job)):
+                emit(dict(info, f=info['nft'], oc=1))
+                emit({'c': 0})
+                return 0
+
+            returncode = await run_pipeline(job, info, nvenc, emit)
+            if returncode == 0:
+                if key is not None:
+                    await loop.run_in_executor(None, cache.store, key, job_outputs(job))
+                emit({'c': 0})
+            return returncode
+        finally:
+            discard_dedup(job)
+
+def job_slots(config):
+    """
+    Returns the CPU pools limiting the concurrent libx264 (False) and
+    h264_nvenc (True) jobs. With pinning, each slot owns a disjoint CPU set.
+    """
+    from lib import CpuPool, split_cpus
+
+    if config.cpus is None:
+        return {False: CpuPool([None] * config.cpu_jobs), True: CpuPool([None] * config.gpu_jobs)}
+    chunks = split_cpus(config.cpus, config.cpu_jobs + config.gpu_jobs)
+    return {False: CpuPool(chunks[:config.cpu_jobs]), True: CpuPool(chunks[config.cpu_jobs:])}
+
+def main_batch(config, profiles):
+    import asyncio
+
+    if '' not in sys.path: # Hack for portable python
+        sys.path.insert(0, '')
+
+    from lib import ffvcodecs, load_manifest
+
+    try:
+        entries = load_manifest(config.batch)
+    except (OSError, ValueError):
+        printj({'e': 'invalid_manifest'})
+        sys.exit(1)
+
+    vcodecs = ffvcodecs()
+
+    async def run(i, entry, slots):
+        job_id = entry.get('id', i)
+        emit = lambda record: printj(dict(record, id=job_id))
+        try:
+            job = make_job(config, profiles, entry)
+        except KeyError:
+            emit({'e': 'invalid_profile'})
+            return 1
+        except Exception as e: # Only this job fails, the others carry on
+            emit({'e': 'fail', 'm': [str(e)]})
+            return 1
+        try:
+            return await run_job(job, vcodecs, slots, emit)
+        except Exception as e:
+            emit({'e': 'fail', 'm': [str(e)]})
+            return 1
+
+    async def run_all():
+        slots = job_slots(config)
+        return await asyncio.gather(*[run(i, entry, slots) for i, entry in enumerate(entries)])
+
+    results = run_async(run_all())
+    failed = sum(1 for r in results if r != 0)
+    printj({'b': [len(results) - failed, failed]})
+    return 0 if failed == 0 else 1
+
+SERVE_BACKLOG = 256
+
+def is_job_id(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+def main_serve(config, profiles):
+    import os, json, signal, asyncio
+
+    if '' not in sys.path: # Hack for portable python
+        sys.path.insert(0, '')
+
+    from lib import ffvcodecs, file_key, check_entry
+
+    if not hasattr(asyncio, 'start_unix_server'):
+        printj({'e': 'unsupported'})
+        return 1
+
+    # Pay for the VapourSynth core, plugin autoloading and capability probing once
+    try:
+        if config.engine == 'inproc':
+            load_vapoursynth()
+        vcodecs = ffvcodecs()
+    except:
+        printj({'e': 'invalid_config'})
+        return 1
+
+    probes = {}
+    def probe(input_file):
+        key = file_key(input_file)
+        if key not in probes:
+            probes[key] = probe_input(input_file)
+        return dict(probes[key])
+
+    slots = {}
+    jobs = {}
+    counter = [0]
+
+    async def run(job_id, job, emit):
+        try:
+            returncode = await run_job(job, vcodecs, slots, emit, probe)
+        except asyncio.CancelledError:
+            emit({'e': 'cancelled'})
+            returncode = None
+        except Exception as e:
+            emit({'e': 'fail', 'm': [str(e)]})
+            returncode = 1
+        finally:
+            del jobs[job_id]
+        return returncode
+
+    async def handle(reader, writer):
+        loop = asyncio.get_event_loop()
+        own = set()
+        pending = asyncio.Queue()
+
+        def send(record):
+            # Telemetry records come from other threads
+            loop.call_soon_threadsafe(pending.put_nowait, record)
+
+        async def write():
+            try:
+                while True:
+                    record = await pending.get()
+                    if pending.qsize() >= SERVE_BACKLOG and 'f' in record and 'e' not in record:
+                        continue # Let a slow client catch up by skipping superseded progress
+                    writer.write((json.dumps(record, separators=(',',':')) + '\n').encode('utf-8'))
+                    await writer.drain()
+            except OSError: # Client gone, its jobs are cancelled by the reading side
+                pass
+        writing = asyncio.ensure_future(write())
+
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                if len(line.strip()) == 0:
+                    continue
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    send({'e': 'invalid_request'})
+                    continue
+
+                if isinstance(request, dict) and 'cancel' in request:
+                    if not is_job_id(request['cancel']):
+                        send({'e': 'invalid_request'})
+                        continue
+                    task = jobs.get(request['cancel'])
+                    if task is None:
+                        send({'e': 'unknown_job', 'id': request['cancel']})
+                    else:
+                        task.cancel()
+                    continue
+
+                try:
+                    check_entry(request, counter[0])
+                except ValueError:
+                    send({'e': 'invalid_request'})
+                    continue
+                if 'id' in request and not is_job_id(request['id']):
+                    send({'e': 'invalid_request'})
+                    continue
+                job_id = request.get('id', counter[0])
+                counter[0] += 1
+                emit = lambda record, job_id=job_id: send(dict(record, id=job_id))
+                if job_id in jobs:
+                    emit({'e': 'duplicate_id'})
+                    continue
+                try:
+                    job = make_job(config, profiles, request)
+                except KeyError:
+                    emit({'e': 'invalid_profile'})
+                    continue
+                jobs[job_id] = asyncio.ensure_future(run(job_id, job, emit))
+                own.add(job_id)
+                emit({'a': 0})
+        finally:
+            # Jobs do not outlive the connection that submitted them
+            for job_id in own:
+                if job_id in jobs:
+                    jobs[job_id].cancel()
+            writing.cancel()
+            writer.close()
+
+    async def serve():
+        loop = asyncio.get_event_loop()
+        slots.update(job_slots(config))
+        stop = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+
+        if os.path.exists(config.serve):
+            os.remove(config.serve)
+        server = await asyncio.start_unix_server(handle, config.serve)
+        os.chmod(config.serve, 0o600)
+        printj({'l': config.serve})
+        try:
+            await stop
+        finally:
+            server.close()
+            await server.wait_closed()
+            tasks = list(jobs.values())
+            for task in tasks:
+                task.cancel()
+            if len(tasks) > 0:
+                await asyncio.wait(tasks)
+            os.remove(config.serve)
+        return 0
+
+    return run_async(serve())
+
+def main_segmented(config, info, nvenc):
+    import os, shutil, tempfile, asyncio
+    from subprocess import PIPE, Popen
+    from lib import ffconcat, ffkeyframes, plan_segments, write_concat_list, load_checkpoint, save_checkpoint, file_key, ProgressReporter, PipelineTelemetry, CpuPool, split_cpus, proc_rss
+
+    checkpoint = None
+    if config.resume:
+        workdir = config.output_file + '.dsvp'
+        os.makedirs(workdir, exist_ok=True)
+        checkpoint_file = os.path.join(workdir, 'checkpoint.json')
+        job = {
+            'input': file_key(config.input_file),
+            'profile': config.profile,
+            'logo': file_key(config.logo) if config.logo is not None else None,
+            'subtitles': file_key(config.subtitles) if config.subtitles is not None else None,
+            'nvenc': nvenc,
+            'overlap': config.segment_overlap,
+            'renditions': [profile for _, profile in config.renditions]
+        }
+        checkpoint = load_checkpoint(checkpoint_file, job)
+    else:
+        workdir = tempfile.mkdtemp(prefix='.dsvp-', dir=os.path.dirname(os.path.abspath(config.output_file)))
+
+    if checkpoint is not None:
+        segments = [tuple(segment) for segment in checkpoint['segments']]
+    else:
+        try:
+            keyframes = ffkeyframes(config.input_file, info['r'])
+        except:
+            keyframes = []
+
+        count = config.segments or config.jobs * 2
+        if config.resume and config.segments == 0: # Aim for chunks of about a minute of source material
+            count = max(count, int(info['d'] // 60))
+        segments = plan_segments(keyframes, info['nf'], count, config.segment_overlap * 4)
+        segments[-1] = (segments[-1][0], None) # Let the last segment run until the real end of the clip
+        if config.resume:
+            checkpoint = {'job': job, 'segments': segments, 'done': [], 'f': 0}
+            save_checkpoint(checkpoint_file, checkpoint)
+
+    outputs = [(config.output_file, config.profile)] + config.renditions
+    files = [[os.path.join(workdir, 'segment%04d.%d.mkv' % (i, r)) for r in range(len(outputs))] for i in range(len(segments))]
+    done = set(i for i in (checkpoint['done'] if checkpoint is not None else []) if all(os.path.exists(fn) for fn in files[i]))
+
+    progress = [None] * len(segments)
+    running = set()
+    pids = {}
+    peak_rss = [0]
+    failed = []
+    info['sg'] = [len(done), len(segments)]
+    if len(done) > 0:
+        info['rs'] = checkpoint['f']
+    reporter = ProgressReporter(info, printj, config.progress_interval)
+
+    def report(p):
+        current = [c for c in progress if c is not None]
+        aggregate = dict(p)
+        for key in ('f', 'fps', 't', 'dup', 'drop'):
+            aggregate[key] = sum(c[key] or 0 for c in current)
+        if config.memory_budget is not None: # All running pipelines, the budget covers them together
+            rss = proc_rss(set(pid for running_pids in pids.values() for pid in running_pids))
+            if rss is not None:
+                peak_rss[0] = max(peak_rss[0], rss)
+                aggregate.update(rss=rss, prss=peak_rss[0])
+        reporter.update(aggregate)
+
+    async def run(i, pool):
+        async with pool.take() as cpus:
+            if len(failed) > 0:
+                return None
+            if i in done:
+                return 0
+            first = segments[i][0]
+            part_files = [fn[:-4] + '.part.mkv' for fn in files[i]]
+            renditions = [(fn, profile) for fn, (_, profile) in zip(part_files[1:], config.renditions)]
+            p1, p2 = start_pipeline(config, part_files[0], nvenc, segments[i], config.segment_overlap, audio=False, offset=first * info['r'][1] / info['r'][0], renditions=renditions, cpus=cpus)
+            running.add(p2)
+            pids[i] = [p2.pid, p1.pid if isinstance(p1, Popen) else os.getpid()]
+
+            telemetry = None
+            if config.telemetry > 0:
+                telemetry = PipelineTelemetry(p1, p2, printj, config.telemetry, extra={'sg': i})
+                telemetry.start()
+
+            def update(p):
+                progress[i] = p
+                report(p)
+
+            try:
+                last_lines, source_lines = await follow(p2, update, p1)
+            finally:
+                running.discard(p2)
+                del pids[i]
+                if telemetry is not None:
+                    telemetry.stop()
+
+            returncode = pipeline_returncode(p1, p2)
+            if returncode == 0:
+                for part_file, fn in zip(part_files, files[i]):
+                    os.replace(part_file, fn)
+                if progress[i] is not None:
+                    progress[i]['fps'] = 0.0
+                info['sg'][0] += 1
+                if checkpoint is not None:
+                    done.add(i)
+                    n = 0
+                    while n in done:
+                        n += 1
+                    checkpoint['f'] = segments[n][0] if n < len(segments) else int(info['nf'])
+                    checkpoint['done'] = sorted(done)
+                    save_checkpoint(checkpoint_file, checkpoint)
+            elif len(failed) == 0:
+                failed.append(i)
+                for p in running:
+                    p.terminate()
+                report_failure(returncode, last_lines, source_lines, source=p1, sg=i)
+            return returncode
+
+    async def run_all():
+        pool = CpuPool(split_cpus(config.cpus, config.jobs) if config.cpus is not None else [None] * config.jobs)
+        return await asyncio.gather(*[run(i, pool) for i in range(len(segments))])
+
+    try:
+        results = run_async(run_all())
+        reporter.flush()
+        if len(failed) > 0:
+            return results[failed[0]]
+
+        for r, (output_file, profile) in enumerate(outputs):
+            list_file = os.path.join(workdir, 'segments.%d.txt' % r)
+            write_concat_list(list_file, [fn[r] for fn in files])
+            p = ffconcat(list_file, config.input_file, output_file, profile, stdout=PIPE, stderr=PIPE)
+            last_lines, _ = run_async(follow(p, lambda progress: None))
+            if p.returncode != 0:
+                report_failure(p.returncode, last_lines)
+                return p.returncode
+        if config.resume:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return 0
+    finally:
+        if not config.resume:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def main_preview(config, info, nvenc):
+    import os, time, shutil, tempfile, asyncio
+    from lib import ffkeyframes, plan_windows, parse_ssim, CpuPool, split_cpus
+
+    try:
+        keyframes = ffkeyframes(config.input_file, info['r'])
+    except:
+        keyframes = []
+    fps = info['r'][0] / info['r'][1]
+    windows = plan_windows(keyframes, info['nf'], config.preview, max(int(config.preview_length * fps + 0.5), 1))
+    ratio = info['nft'] / info['nf'] # Output frames per source frame
+
+    workdir = tempfile.mkdtemp(prefix='.dsvp-', dir=os.path.dirname(os.path.abspath(config.output_file)) if config.output_file is not None else None)
+    results = [None] * len(windows)
+
+    async def run(i, pool):
+        first, last = windows[i]
+        async with pool.take() as cpus:
+            files = [os.path.join(workdir, 'preview%04d.%d.mkv' % (i, r)) for r in range(len(config.renditions) + 1)]
+            renditions = [(fn, profile) for fn, (_, profile) in zip(files[1:], config.renditions)]
+            started = time.monotonic()
+            p1, p2 = start_pipeline(config, files[0], nvenc, windows[i], config.segment_overlap, cpus, audio=False, offset=first / fps, renditions=renditions, params=None if nvenc else {'ssim': 1})
+
+            samples = []
+            ssim = []
+            def update(p):
+                if p['f']:
+                    samples.append((time.monotonic(), p['f']))
+            def line(data):
+                v = parse_ssim(data)
+                if v is not None:
+                    ssim.append(v)
+            last_lines, source_lines = await follow(p2, update, p1, line)
+            returncode = pipeline_returncode(p1, p2)
+            if returncode != 0:
+                report_failure(returncode, last_lines, source_lines, source=p1, pw=i)
+                return returncode
+
+            # Measured from the first encoded frame on, startup is reported separately
+            frames = samples[-1][1] if len(samples) > 0 else 0
+            elapsed = samples[-1][0] - samples[0][0] if len(samples) > 1 else 0
+            result = {
+                'pw': i,
+                'win': [first, last],
+                'f': frames,
+                'fps': round((frames - samples[0][1]) / elapsed, 2) if elapsed > 0 else None,
+                'st': round(samples[0][0] - started, 2) if len(samples) > 0 else None,
+                'sz': os.path.getsize(files[0]),
+                'ssim': ssim[0] if len(ssim) > 0 else None
+            }
+            results[i] = result
+            printj(result)
+            return 0
+
+    async def run_all():
+        pool = CpuPool(split_cpus(config.cpus, config.jobs) if config.cpus is not None else [None] * config.jobs)
+        return await asyncio.gather(*[run(i, pool) for i in range(len(windows))])
+
+    started = time.monotonic()
+    try:
+        returncodes = run_async(run_all())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.monotonic() - started
+    failed = [c for c in returncodes if c != 0]
+    if len(failed) > 0:
+        return failed[0]
+
+    frames = sum(r['f'] for r in results)
+    summary = {'n': len(results)}
+    if frames > 0 and elapsed > 0: # Wall clock of all windows, including their startup and their competition for the CPUs
+        summary['fps'] = round(frames / elapsed, 2)
+        summary['eta'] = round(info['nft'] / summary['fps'], 1)
+    if frames > 0:
+        duration = frames / ratio / fps
+        summary['br'] = int(sum(r['sz'] for r in results) * 8 / 1000 / duration)
+    scores = [r['ssim'] for r in results if r['ssim'] is not None]
+    if len(scores) > 0:
+        summary['ssim'] = round(sum(scores) / len(scores), 5)
+    printj({'pv': summary})
+    return 0
 
 def cpuinfo():
     if sys.platform.startswith('linux'):
         import re
-        return re.search(r'^model name\s*:\s*(.+)$', open('/proc/cpuinfo', 'rb').read(), re.M).group(1).decode('utf-8')
+        return re.search(rb'^model name\s*:\s*(.+)$', open('/proc/cpuinfo', 'rb').read(), re.M).group(1).decode('utf-8')
     elif sys.platform == 'darwin' or sys.platform.startswith('freebsd'):
         import subprocess
         return subprocess.check_output(['/usr/sbin/sysctl', '-n', 'machdep.cpu.brand_string']).decode('utf-8').strip()
@@ -120,24 +1086,25 @@ if __name__ == '__vapoursynth__':
     analyse_config = g.get('analyse')
     smooth_config = g.get('smooth')
     if analyse_config is None or smooth_config is None:
-        from lib import build_svp_config
         profile = resolve_profile(load_profiles(), g.get('profile', 'default'))
         if analyse_config is None:
-            analyse_config = build_svp_config(profile['analyse'])
+            analyse_config = profile['compiled']['analyse']
         if smooth_config is None:
-            smooth_config = build_svp_config(profile['smooth'])
-
-    vs, core = load_vapoursynth()
-
-    clip = core.ffms2.Source(source=g['source'])
-    clip = clip.resize.Bicubic(format=vs.YUV420P8)
+            smooth_config = profile['compiled']['smooth']
 
-    svp_super = core.svp1.Super(clip, '{gpu:1}' if gpu else '{gpu:0}')
-    svp_vectors = core.svp1.Analyse(svp_super['clip'], svp_super['data'], clip, analyse_config)
-    svp_smooth = core.svp2.SmoothFps(clip, svp_super['clip'], svp_super['data'], svp_vectors['clip'], svp_vectors['data'], smooth_config)
-    svp_smooth = core.std.AssumeFPS(svp_smooth, fpsnum=svp_smooth.fps_num, fpsden=svp_smooth.fps_den)
+    vs, core = load_vapoursynth(int(g.get('threads', 0)), int(g['cachesize']) if 'cachesize' in g else None)
 
-    svp_smooth.set_output()
+    first = g.get('first')
+    last = g.get('last')
+    index_cache = (g['indexcache'], int(g['indexcachesize'])) if 'indexcache' in g else None
+    dedup = None
+    if 'dedup' in g:
+        import json
+        with open(g['dedup'], 'r') as f:
+            dedup = json.load(f)
+    clip = build_graph(vs, core, g['source'], analyse_config, smooth_config, gpu,
+        int(first) if first is not None else None, int(last) if last is not None else None, int(g.get('overlap', 0)), g.get('mvcache'), index_cache, g.get('decoder'), dedup)
+    clip.set_output()
 
 elif __name__ == '__main__':
     import argparse, os
@@ -167,10 +1134,14 @@ elif __name__ == '__main__':
     elif '--list-profiles' in sys.argv: 
         printj({'p': list(profiles.keys())})
         sys.exit()
+    elif '--clear-cache' in sys.argv:
+        from lib import clear_caches
+        clear_caches()
+        sys.exit()
 
     class StoreExistingPath(argparse.Action):
         def __call__(self, parser, namespace, values, option_string=None):
-            if not os.path.exists(values):
+            if values is not None and not os.path.exists(values):
                 raise ValueError('File not found: %s' % (values))
             setattr(namespace, self.dest, values)
 
@@ -179,26 +1150,105 @@ elif __name__ == '__main__':
             setattr(namespace, self.dest, json.loads(values))
 
     parser = argparse.ArgumentParser(description='video interpolation utility for smooth FPS')
-    parser.add_argument('input_file', action=StoreExistingPath, help='path to the input file to be processed')
-    parser.add_argument('output_file', help='path to the output file; the extension determines the container format')
+    parser.add_argument('input_file', nargs='?', action=StoreExistingPath, help='path to the input file to be processed')
+    parser.add_argument('output_file', nargs='?', help='path to the output file; the extension determines the container format')
+
+    parser.add_argument('-b', '--batch', metavar='MANIFEST', help='process all jobs of a JSON (lines) manifest with input, output and optional profile, override, logo, subtitles and gpu keys; use - for stdin')
+    parser.add_argument('--cpu-jobs', type=int, default=1, help='maximum number of concurrent libx264 jobs in batch and server mode')
+    parser.add_argument('--gpu-jobs', type=int, default=1, help='maximum number of concurrent h264_nvenc jobs in batch and server mode')
+
+    parser.add_argument('--serve', metavar='SOCKET', help='keep VapourSynth and the probed capabilities loaded and accept jobs as JSON lines (like manifest entries, or {"cancel": id}) on the given Unix socket; progress records are sent back with the job id')
 
     parser.add_argument('-s', '--subtitles', action=StoreExistingPath, help='read and render subtitles from the given file')
     parser.add_argument('-S', '--inline-subtitles', action='store_true', default=False, help='read and render subtitles from the input file (overrides -s)')
 
+    parser.add_argument('-R', '--rendition', action='append', default=[], metavar='PROFILE:OUTPUT', help='additionally encode the interpolated video with the given profile to the given file; the interpolation itself uses the settings of --profile (may be repeated)')
+
     parser.add_argument('-l', '--logo', action=StoreExistingPath, help='overlay image to be rendered on the bottom left')
 
     parser.add_argument('-G', '--gpu', action='store_true', default=False, help='use GPU acceleration')
 
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='split the input at keyframes and run this many pipelines in parallel')
+    parser.add_argument('--segments', type=int, default=0, help='number of segments for parallel processing (default: twice the number of jobs)')
+    parser.add_argument('--segment-overlap', type=int, default=8, help='number of extra frames processed at each segment edge')
+    parser.add_argument('-r', '--resume', action='store_true', default=False, help='keep finished segments and a checkpoint next to the output file and continue from there when run again')
+
+    parser.add_argument('-E', '--engine', choices=['vspipe', 'inproc'], help='run the VapourSynth graph through vspipe or inside this process (default: inproc with --serve, else vspipe)')
+    parser.add_argument('-D', '--decoder', choices=['ffms2', 'ffmpeg', 'vaapi', 'auto'], default='ffms2', help='decode the input with ffms2 inside the VapourSynth graph, with a multi-threaded ffmpeg process, or with an ffmpeg process using VAAPI (falling back to software); auto uses VAAPI if possible, else ffmpeg for HEVC, VP9, AV1 and inputs of 1440p or more')
+    parser.add_argument('--prefetch', type=int, default=0, help='number of frame requests kept in flight by the inproc engine (default: number of CPUs)')
+
+    parser.add_argument('--preview', type=int, default=0, metavar='K', help='instead of processing the whole input, encode K short windows spread across it (--jobs of them at a time) and report the measured fps, the projected time of the full job, the bitrate and the x264 SSIM; output_file is optional')
+    parser.add_argument('--preview-length', type=float, default=5, metavar='SECONDS', help='length of each preview window in source time')
+
+    parser.add_argument('--no-passthrough', dest='passthrough', action='store_false', default=True, help='interpolate even if the input already has the target frame rate')
+
+    parser.add_argument('--index-cache', metavar='DIR', help='directory for the shared ffms2 index cache (default: in the cache directory; empty to let ffms2 write indexes next to the input)')
+    parser.add_argument('--index-cache-size', type=float, default=16, metavar='GB', help='maximum total size of the ffms2 index cache')
+
+    parser.add_argument('--mv-cache', action='store_true', default=False, help='store the motion vectors on disk and reuse them for later runs with the same input and analyse settings (not with profiles that skip duplicate frames)')
+
+    parser.add_argument('--pin', action='store_true', default=False, help='give each pipeline its own set of CPUs, split it between VapourSynth and the encoder and pin both to their share')
+    parser.add_argument('--cpus', metavar='LIST', help='CPUs to distribute among the pipelines, e.g. 0-7,16-23 (implies --pin; default: all available)')
+    parser.add_argument('--vs-share', type=float, metavar='FRACTION', help='fraction of each pipeline\'s CPUs given to VapourSynth (default: calibrated per CPU model, profile and encoder)')
+
+    parser.add_argument('--output-cache', action='store_true', default=False, help='keep finished outputs in a cache keyed by the input, profile, encoder and overlays, and hand out a copy (a reflink where supported) when the same job is run again')
+    parser.add_argument('--output-cache-dir', metavar='DIR', help='directory of the output cache (default: in the cache directory)')
+    parser.add_argument('--output-cache-size', type=float, default=64, metavar='GB', help='maximum total size of the output cache')
+
+    parser.add_argument('--memory-budget', metavar='SIZE', help='memory available to the job, e.g. 6G; sizes the VapourSynth cache, the encoder lookahead and the input queue to fit, refuses jobs that cannot fit and reports the actual RSS with the progress')
+
+    parser.add_argument('--stream', choices=['hls', 'fmp4'], help='write the output so it can be played while the job runs: an HLS playlist with fragmented MP4 segments (the output file being the playlist) or a single fragmented MP4 file')
+    parser.add_argument('--stream-segment', type=float, default=6, metavar='SECONDS', help='target duration of HLS segments')
+
+    parser.add_argument('--progress-interval', type=float, default=1.0, help='minimum number of seconds between progress records')
+    parser.add_argument('--telemetry', type=float, default=0, metavar='SECONDS', help='report CPU, memory and pipe statistics of vspipe and ffmpeg at this interval and at exit (Linux only)')
+
     parser.add_argument('-p', '--profile', default='default', help='use specific encoding profile')
     parser.add_argument('-o', '--override', action=StoreJSON, help='override encoding profile (JSON format)')
 
     parser.add_argument('--version', action='store_true', default=False, help='output version and platform information and exit')
     parser.add_argument('--list-profiles', action='store_true', default=False, help='list built-in profiles and exit')
+    parser.add_argument('--clear-cache', action='store_true', default=False, help='invalidate the cached ffmpeg capabilities, probe results and calibrations and exit (the index, vector and output caches are kept)')
 
     args = parser.parse_args()
+    if args.index_cache is None:
+        from lib import index_cache_dir
+        args.index_cache = index_cache_dir()
+
+    if args.cpus is not None:
+        from lib import parse_cpu_list
+        args.cpus = parse_cpu_list(args.cpus)
+    elif args.pin:
+        from lib import available_cpus
+        args.cpus = available_cpus()
+
+    if args.memory_budget is not None:
+        from lib import parse_size
+        args.memory_budget = parse_size(args.memory_budget)
+
+    if args.engine is None:
+        args.engine = 'inproc' if args.serve is not None else 'vspipe'
+
+    if args.serve is not None:
+        sys.exit(main_serve(args, profiles))
+    elif args.batch is not None:
+        sys.exit(main_batch(args, profiles))
+    elif args.input_file is None or (args.output_file is None and args.preview == 0):
+        parser.error('the input_file and output_file arguments are required')
+
     if args.inline_subtitles:
         args.subtitles = args.input_file
 
-    args.profile = resolve_profile(profiles, args.profile, args.override)
+    try:
+        args.renditions = []
+        for rendition in args.rendition:
+            profile_name, sep, output_file = rendition.partition(':')
+            if len(sep) == 0:
+                parser.error('invalid rendition: %s' % rendition)
+            args.renditions.append((output_file, resolve_profile(profiles, profile_name, args.override)))
+        args.profile = resolve_profile(profiles, args.profile, args.override)
+    except KeyError:
+        printj({'e': 'invalid_profile'})
+        sys.exit(1)
 
     sys.exit(main(args))
@@ -8,6 +8,20 @@
 #  Licensed under the EUPL
 #
 
+from .cache_helper import *
 from .ffmpeg_helper import *
 from .vspipe_helper import *
 from .proc_follow import *
+from .segment_helper import *
+from .vsengine_helper import *
+from .progress_helper import *
+from .telemetry_helper import *
+from .profile_helper import *
+from .batch_helper import *
+from .vectors_helper import *
+from .ffindex_helper import *
+from .affinity_helper import *
+from .memory_helper import *
+from .outputs_helper import *
+from .decode_helper import *
+from .dedup_helper import *
@@ -0,0 +1,115 @@
+#
+#  affinity_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, asyncio, contextlib
+
+from .cache_helper import Cache
+
+__all__ = ['CALIBRATION_CACHE', 'CpuPool', 'available_cpus', 'parse_cpu_list', 'split_cpus', 'plan_threads', 'pinned', 'wait_timed']
+
+CALIBRATION_CACHE = Cache('calibration', 64)
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def parse_cpu_list(spec):
+    """
+    Parses a CPU list in the format used by taskset and /sys (e.g. "0-3,8").
+    """
+    cpus = set()
+    for part in spec.split(','):
+        first, sep, last = part.strip().partition('-')
+        if len(sep) == 0:
+            cpus.add(int(first))
+        else:
+            cpus.update(range(int(first), int(last) + 1))
+    return sorted(cpus)
+
+def split_cpus(cpus, count):
+    """
+    Splits the given CPUs into `count` contiguous chunks of (almost) equal size.
+    CPUs are shared round-robin if there are fewer CPUs than chunks.
+    """
+    if len(cpus) < count:
+        return [[cpus[i % len(cpus)]] for i in range(count)]
+    return [cpus[(len(cpus) * i // count):(len(cpus) * (i + 1) // count)] for i in range(count)]
+
+def plan_threads(cpus, vs_share):
+    """
+    Divides a job's CPUs between VapourSynth and the encoder according to the
+    fraction of the total CPU time VapourSynth is expected to need. Returns
+    the two CPU lists; both get all CPUs if there is only one.
+    """
+    if len(cpus) < 2:
+        return cpus, cpus
+    n = min(max(int(len(cpus) * vs_share + 0.5), 1), len(cpus) - 1)
+    return cpus[:n], cpus[n:]
+
+@contextlib.contextmanager
+def pinned(cpus):
+    """
+    Pins the calling thread to the given CPUs (unless None) for the duration
+    of the block. Processes started in it inherit the mask from the start,
+    and so does every thread they spawn (setting it on a running process
+    only affects its main thread on Linux). Other threads of this process
+    keep their own mask, and the previous one is restored afterwards.
+    """
+    if cpus is None or not hasattr(os, 'sched_setaffinity'):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+def wait_timed(p):
+    """
+    Waits for the given Popen object and returns the CPU time (user and
+    system) the process consumed in seconds, or the elapsed time on platforms
+    without wait4().
+    """
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(p.pid, 0)
+        p.returncode = -(status & 0x7f) if status & 0x7f else status >> 8
+        return usage.ru_utime + usage.ru_stime
+    import time
+    start = time.monotonic()
+    p.wait()
+    return time.monotonic() - start
+
+class CpuPool(object):
+    """
+    Hands out CPU sets to concurrently running jobs, one per slot. Use as
+    `async with pool.take() as cpus`. With `chunks` being a list of Nones it
+    simply limits the number of concurrent jobs like a semaphore.
+    """
+    def __init__(self, chunks):
+        self.__free = asyncio.Queue()
+        for chunk in chunks:
+            self.__free.put_nowait(chunk)
+
+    def take(self):
+        return CpuLease(self.__free)
+
+class CpuLease(object):
+    def __init__(self, free):
+        self.__free = free
+        self.__cpus = None
+
+    async def __aenter__(self):
+        self.__cpus = await self.__free.get()
+        return self.__cpus
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__free.put_nowait(self.__cpus)
@@ -0,0 +1,61 @@
+#
+#  batch_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import sys, json
+
+__all__ = ['load_manifest', 'check_entry']
+
+MANIFEST_KEYS = {'id', 'input', 'output', 'profile', 'override', 'logo', 'subtitles', 'inline_subtitles', 'gpu', 'renditions'}
+MANIFEST_TYPES = {
+    'input': str, 'output': str, 'profile': str, 'override': dict, 'logo': str,
+    'subtitles': str, 'inline_subtitles': bool, 'gpu': bool, 'renditions': list
+}
+RENDITION_TYPES = {'output': str, 'profile': str}
+
+def load_manifest(path):
+    """
+    Reads a batch manifest from the given path ('-' for stdin). The manifest
+    is either a JSON array or JSON lines of job objects with at least the
+    `input` and `output` keys; `renditions` is a list of objects with an
+    `output` and an optional `profile` key. Raises ValueError for malformed
+    manifests.
+    """
+    if path == '-':
+        data = sys.stdin.read()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = f.read()
+
+    if data.lstrip().startswith('['):
+        entries = json.loads(data)
+    else:
+        entries = [json.loads(line) for line in data.splitlines() if len(line.strip()) > 0]
+
+    for i, entry in enumerate(entries):
+        check_entry(entry, i)
+    return entries
+
+def check_types(entry, types):
+    return all(isinstance(entry[key], t) for key, t in types.items() if key in entry)
+
+def check_entry(entry, i=0):
+    """
+    Raises ValueError unless the given manifest entry (or server request) has
+    the required keys, only known ones and values of the expected types.
+    """
+    if not isinstance(entry, dict) or 'input' not in entry or 'output' not in entry:
+        raise ValueError('Invalid manifest entry #%d' % i)
+    unknown = set(entry.keys()) - MANIFEST_KEYS
+    if len(unknown) > 0:
+        raise ValueError('Unknown keys in manifest entry #%d: %s' % (i, ', '.join(sorted(unknown))))
+    if not check_types(entry, MANIFEST_TYPES):
+        raise ValueError('Invalid values in manifest entry #%d' % i)
+    if not all(isinstance(r, dict) and 'output' in r and check_types(r, RENDITION_TYPES) for r in entry.get('renditions', [])):
+        raise ValueError('Invalid renditions in manifest entry #%d' % i)
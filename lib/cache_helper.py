@@ -0,0 +1,137 @@
+#
+#  cache_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, sys, json, shutil, tempfile, functools
+
+__all__ = ['Cache', 'cached', 'cache_dir', 'clear_caches', 'file_key', 'binary_key', 'evict_lru']
+
+def cache_dir():
+    path = os.environ.get('DSVP_CACHE_DIR')
+    if path is None:
+        if sys.platform.startswith('win'):
+            base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        else:
+            base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'dsvp')
+    return path
+
+def file_key(path):
+    st = os.stat(path)
+    return '%s:%d:%d' % (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+def binary_key(name):
+    path = shutil.which(name)
+    if path is None:
+        return None
+    return file_key(os.path.realpath(path))
+
+class Cache(object):
+    """
+    Small persistent key/value store backed by a single JSON file in the cache
+    directory. Values must be JSON serializable. Writes are atomic; concurrent
+    writers may lose each other's entries, which only costs a recomputation.
+    The oldest entries are dropped once `max_entries` is exceeded.
+    """
+    registry = []
+
+    def __init__(self, name, max_entries=4096):
+        self.name = name
+        self.max_entries = max_entries
+        Cache.registry.append(self)
+
+    @property
+    def path(self):
+        return os.path.join(cache_dir(), self.name + '.json')
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key, default=None):
+        return self.load().get(key, default)
+
+    def put(self, key, value):
+        entries = self.load()
+        entries.pop(key, None)
+        entries[key] = value
+        while len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.' + self.name, dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, separators=(',',':'))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def cached(cache, key):
+    """
+    Decorator for memoizing a function's result in the given Cache. The `key`
+    callable receives the same arguments and returns a string identifying the
+    result, or None if the result must not be cached. The uncached function
+    stays accessible through the `__wrapped__` attribute.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            try:
+                k = key(*args)
+            except OSError:
+                k = None
+            if k is None:
+                return fn(*args)
+            k = '%s|%s' % (fn.__name__, k)
+            value = cache.get(k)
+            if value is None:
+                value = fn(*args)
+                cache.put(k, value)
+            return value
+        return wrapper
+    return decorator
+
+def clear_caches():
+    for cache in Cache.registry:
+        cache.clear()
+
+def evict_lru(directory, max_bytes, suffix=''):
+    """
+    Deletes the least recently used files (by mtime, which users of the cache
+    directory bump on every hit) ending with `suffix` from the given directory
+    until their total size is at most `max_bytes`.
+    """
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(suffix) and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,193 @@
+#
+#  decode_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, re, glob, queue, ctypes, weakref, threading, subprocess
+from collections import OrderedDict
+from .ffmpeg_helper import ffdecode, ffhwdecode
+
+__all__ = ['FrameReader', 'pipe_source', 'reader_window', 'render_node', 'select_decoder']
+
+# Codecs commonly supported by VAAPI drivers; others are not even tried
+VAAPI_CODECS = {'h264', 'hevc', 'mpeg2video', 'vc1', 'vp8', 'vp9', 'av1'}
+# Codecs (or frame sizes) for which decoding takes a large share of the CPU time
+HEAVY_CODECS = {'hevc', 'vp9', 'av1'}
+HEAVY_PIXELS = 2560 * 1440
+# Frames a request may lag behind the decoder before it is restarted with a seek
+MAX_SKIP = 250
+# Frames kept by a reader beyond one per VapourSynth thread
+WINDOW_SLACK = 16
+
+RE_PTS_TIME = re.compile(rb'\] n:\s*\d+ pts:\s*\S+ pts_time:(\S+)')
+
+def reader_window(threads=0):
+    """
+    Returns the number of frames a FrameReader keeps for a graph running
+    `threads` VapourSynth threads (0 for one per core).
+    """
+    return (threads if threads > 0 else (os.cpu_count() or 1)) + WINDOW_SLACK
+
+def render_node():
+    nodes = sorted(glob.glob('/dev/dri/renderD*'))
+    return nodes[0] if len(nodes) > 0 else None
+
+def select_decoder(decoder, input_file, info, hwaccels):
+    """
+    Resolves the --decoder choice for the given input to 'ffms2', 'ffmpeg'
+    (threaded software decoding in a separate ffmpeg process) or 'vaapi'.
+    'auto' picks VAAPI if the input decodes on the first render node, else
+    ffmpeg for inputs which are expensive to decode and ffms2 for the rest.
+    'vaapi' falls back to ffmpeg. Variable frame rate inputs always use
+    ffms2, as the frames of a pipe are numbered by their timestamps.
+    """
+    if decoder == 'ffms2' or info.get('w') is None or info.get('nf') is None or info.get('vfr', True):
+        return 'ffms2'
+    if decoder in ('vaapi', 'auto') and 'vaapi' in hwaccels and info.get('c') in VAAPI_CODECS:
+        device = render_node()
+        if device is not None and ffhwdecode(input_file, 'vaapi', device, info.get('bd') or 8):
+            return 'vaapi'
+    if decoder == 'auto' and info.get('c') not in HEAVY_CODECS and info['w'] * info['h'] < HEAVY_PIXELS:
+        return 'ffms2'
+    return 'ffmpeg'
+
+class FrameReader(object):
+    """
+    Random access to the frames of a sequential decoder process. The last
+    `window` frames are kept, so that the slightly out-of-order requests of
+    VapourSynth's worker threads are served from memory; a request for an
+    older frame, or one far ahead, restarts the decoder with a seek. The
+    decoder reports the timestamp of each frame on stderr (see ffdecode()),
+    from which the frame's number is derived, counting from `start_time`.
+    A frame missing from the stream repeats its predecessor, and frames
+    past the end of the stream repeat the last one. The decoder is stopped
+    by close(), or when the reader is garbage collected along with its clip.
+    """
+    def __init__(self, start_decoder, frame_size, fps, window=32, start_time=0.0):
+        self.__start_decoder = start_decoder
+        self.__frame_size = frame_size
+        self.__fps = fps
+        self.__window = window
+        self.__start_time = start_time
+        self.__frames = OrderedDict()
+        self.__proc = None
+        self.__stop = None
+        self.__times = None
+        self.__next = 0
+        self.__last = None
+        self.__lock = threading.Lock()
+
+    def __restart(self, n):
+        self.close()
+        # Half a frame early, so that rounding in the demuxer's seek cannot skip frame n
+        self.__proc = self.__start_decoder((n - 0.5) * self.__fps[1] / self.__fps[0] if n > 0 else None)
+        # Holds no reference to the reader, only to the process (also runs at exit)
+        self.__stop = weakref.finalize(self, stop_decoder, self.__proc)
+        self.__times = queue.Queue()
+        threading.Thread(target=read_timestamps, args=(self.__proc.stderr, self.__times), daemon=True).start()
+        self.__next = n
+
+    def __read(self):
+        frame = bytearray(self.__frame_size)
+        view = memoryview(frame)
+        pos = 0
+        while pos < len(frame):
+            n = self.__proc.stdout.readinto(view[pos:])
+            if not n:
+                return None, None
+            pos += n
+        # showinfo logs a frame before it is written, so its timestamp is already queued
+        try:
+            pts = float(self.__times.get())
+        except (TypeError, ValueError): # Decoder gone, or a frame without timestamp
+            raise RuntimeError('decoder reported no timestamp for a frame')
+        return int(round((pts - self.__start_time) * self.__fps[0] / self.__fps[1])), frame
+
+    def get(self, n):
+        with self.__lock:
+            frame = self.__frames.get(n)
+            if frame is not None:
+                return frame
+            if self.__proc is None or n < self.__next - len(self.__frames) or n >= self.__next + MAX_SKIP:
+                # Start a little early, since neighbouring requests tend to arrive out of order
+                self.__restart(max(n - self.__window // 2, 0))
+            while self.__next <= n:
+                k, frame = self.__read()
+                if frame is None:
+                    if self.__proc.wait() != 0 or self.__last is None:
+                        raise RuntimeError('decoder failed with code %d' % self.__proc.returncode)
+                    return self.__last
+                self.__frames[k] = frame
+                self.__last = frame
+                self.__next = k + 1
+                if len(self.__frames) > self.__window:
+                    self.__frames.popitem(last=False)
+            frame = self.__frames.get(n)
+            if frame is None: # Not in the stream, show the frame before it
+                earlier = [k for k in self.__frames if k < n]
+                frame = self.__frames[max(earlier)] if len(earlier) > 0 else self.__last
+            return frame
+
+    def close(self):
+        self.__proc = None
+        self.__frames.clear()
+        if self.__stop is not None:
+            self.__stop()
+            self.__stop = None
+
+def stop_decoder(proc):
+    proc.kill()
+    proc.stdout.close()
+    proc.wait()
+
+def read_timestamps(stderr, times):
+    try:
+        for line in stderr:
+            m = RE_PTS_TIME.search(line)
+            if m is not None:
+                times.put(m.group(1))
+    finally:
+        stderr.close()
+        times.put(None)
+
+def copy_into(frame, data):
+    src = ctypes.addressof((ctypes.c_ubyte * len(data)).from_buffer(data))
+    offset = 0
+    fmt = frame.format
+    for p in range(fmt.num_planes):
+        width = frame.width >> (fmt.subsampling_w if p > 0 else 0)
+        height = frame.height >> (fmt.subsampling_h if p > 0 else 0)
+        stride = frame.get_stride(p)
+        ptr = frame.get_write_ptr(p)
+        address = getattr(ptr, 'value', ptr)
+        if stride == width:
+            ctypes.memmove(address, src + offset, width * height)
+        else:
+            for y in range(height):
+                ctypes.memmove(address + y * stride, src + offset + y * width, width)
+        offset += width * height
+
+def pipe_source(vs, core, source, info, decoder='ffmpeg', threads=0, window=None):
+    """
+    Returns a YUV420P8 clip of the given file decoded by an ffmpeg process,
+    in software or, with `decoder` being 'vaapi', on the first render node.
+    `info` is the file's ffprobe() result.
+    """
+    hwaccel, device = ('vaapi', render_node()) if decoder == 'vaapi' else (None, None)
+    start_decoder = lambda start: ffdecode(source, hwaccel, device, info.get('bd') or 8, start, threads, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    width, height = info['w'], info['h']
+    if window is None:
+        window = reader_window(threads)
+    reader = FrameReader(start_decoder, width * height + 2 * (width // 2) * (height // 2), info['r'], window, info.get('ts') or 0.0)
+
+    blank = core.std.BlankClip(format=vs.YUV420P8, width=width, height=height, length=int(info['nf']), fpsnum=info['r'][0], fpsden=info['r'][1])
+    def render(n, f):
+        frame = f.copy()
+        copy_into(frame, reader.get(n))
+        return frame
+    return core.std.ModifyFrame(blank, blank, render)
@@ -0,0 +1,56 @@
+#
+#  dedup_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+__all__ = ['frame_map', 'held_frame', 'held_fraction', 'hold_static']
+
+def frame_map(runs, n_frames):
+    """
+    Turns the runs returned by ffdupes() into a bytearray with one entry per
+    frame, non-zero for frames repeating their predecessor.
+    """
+    dup = bytearray(n_frames)
+    for first, last in runs:
+        dup[first:min(last + 1, n_frames)] = b'\x01' * (min(last + 1, n_frames) - first)
+    return dup
+
+def held_frame(dup, n, num, den):
+    """
+    Returns the source frame to show as output frame `n`, if it lies between
+    two frames which are the same and therefore needs no interpolation, or
+    None. `num`/`den` is the ratio of the output to the input frame rate.
+    """
+    k = n * den // num
+    if k * num == n * den or k + 1 >= len(dup) or not dup[k + 1]:
+        return None # On a source frame already, or in motion
+    return k
+
+def held_fraction(dup, num, den):
+    n_out = len(dup) * num // den
+    if n_out == 0:
+        return 0.0
+    return sum(1 for n in range(n_out) if held_frame(dup, n, num, den) is not None) / n_out
+
+def hold_static(core, clip, smooth, dup):
+    """
+    Returns the interpolated clip `smooth` with every frame between two
+    identical source frames of `clip` replaced by the source frame itself, so
+    that SVP neither renders them nor analyses static stretches.
+    """
+    from fractions import Fraction
+    ratio = Fraction(smooth.fps_num, smooth.fps_den) / Fraction(clip.fps_num, clip.fps_den)
+    # Built once: source frame n * den // num as output frame n, which is the
+    # one held_frame() picks, so that each frame merely chooses between nodes
+    held = core.std.Interleave([clip] * ratio.numerator)
+    held = core.std.SelectEvery(held, ratio.denominator, [0])
+    held = core.std.AssumeFPS(held, src=smooth)
+
+    def select(n):
+        return smooth if held_frame(dup, n, ratio.numerator, ratio.denominator) is None else held
+    return core.std.FrameEval(smooth, select)
@@ -0,0 +1,64 @@
+#
+#  ffindex_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, sys, hashlib, contextlib
+from .cache_helper import cache_dir, file_key, evict_lru
+
+__all__ = ['ffms2_source', 'index_cache_dir']
+
+if sys.platform != 'win32':
+    import fcntl
+else:
+    fcntl = None
+
+def index_cache_dir():
+    return os.path.join(cache_dir(), 'ffindex')
+
+@contextlib.contextmanager
+def index_lock(path):
+    if fcntl is None: # Concurrent builds are still safe thanks to the rename, just wasteful
+        yield
+        return
+    with open(path, 'a+b') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def ffms2_source(core, source, directory=None, max_bytes=16 * 1024**3):
+    """
+    Opens the given file with ffms2, using an index from the shared cache
+    directory keyed by the file's path, size and mtime. Missing indexes are
+    built by one process at a time and published by an atomic rename; the
+    directory is kept below `max_bytes` by evicting the least recently used
+    indexes.
+    """
+    if directory is None:
+        directory = index_cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    key = hashlib.sha256(file_key(source).encode('utf-8')).hexdigest()
+    cachefile = os.path.join(directory, key + '.ffindex')
+
+    if os.path.exists(cachefile):
+        os.utime(cachefile)
+    else:
+        with index_lock(os.path.join(directory, 'lock.' + key[:2])):
+            if not os.path.exists(cachefile):
+                part = '%s.%d.part' % (cachefile, os.getpid())
+                try:
+                    core.ffms2.Index(source, cachefile=part, overwrite=True)
+                    os.replace(part, cachefile)
+                finally:
+                    if os.path.exists(part):
+                        os.remove(part)
+                evict_lru(directory, max_bytes, '.ffindex')
+
+    return core.ffms2.Source(source=source, cachefile=cachefile)
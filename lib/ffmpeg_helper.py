@@ -9,27 +9,47 @@
 #
 
 import os, re, subprocess
+from .cache_helper import Cache, cached, file_key, binary_key
 
-__all__ = ['ffmpeg', 'ffhwaccels', 'ffprobe', 'ffversion', 'ffvcodecs', 'parse_progress']
+__all__ = ['ffmpeg', 'encoder_params', 'ffconcat', 'ffremux', 'ffdecode', 'ffdupes', 'ffhwaccels', 'ffhwdecode', 'ffprobe', 'ffmotion', 'ffversion', 'ffvcodecs', 'parse_ssim', 'SegmentTracker']
 
 ASCII_LINESEP = os.linesep.encode('ascii')
 
+FFMPEG_CACHE = Cache('ffmpeg', 64)
+FFPROBE_CACHE = Cache('ffprobe')
+FFPROBE_FORMAT = 5
+FRAMEMAP_CACHE = Cache('framemap', 64)
+
 RE_FILTER_ESCAPE1 = re.compile(r'[:\\\']')
 RE_FILTER_ESCAPE2 = re.compile(r'[\[\],;\\\']')
 FN_FILTER_ESCAPE = lambda m: '\\' + m.group()
 def escape_filter_param(param):
     return RE_FILTER_ESCAPE2.sub(FN_FILTER_ESCAPE, RE_FILTER_ESCAPE1.sub(FN_FILTER_ESCAPE, param))
 
-def build_filter(overlay, subtitles):
+def build_filter(overlay, subtitles, offset=None, outputs=1, overlay_input=2):
+    # Everything stays in YUV: the logo is converted to YUVA once (it is a
+    # single frame that overlay keeps repeating) and only blended over its own
+    # area, and libass draws its bitmaps directly onto the YUV frames.
+    graph = []
     chain = []
     if overlay is not None:
-        chain.append('[2:v]overlay=20:H-h-20:format=rgb')
+        graph.append('[%d:v]format=yuva420p[logo]' % overlay_input)
+        chain.append('[logo]overlay=20:H-h-20:format=yuv420')
     if subtitles is not None:
+        if offset:
+            chain.append('setpts=PTS+%s/TB' % offset)
         chain.append('subtitles=' + escape_filter_param(subtitles))
+        if offset:
+            chain.append('setpts=PTS-STARTPTS')
     if len(chain) > 0:
         chain[0] = '[0:v]' + chain[0]
-        chain.append('format=yuv420p[out]')
-        return ['-filter_complex', ','.join(chain)]
+        if outputs > 1:
+            chain.append('format=yuv420p')
+            chain.append('split=%d%s' % (outputs, ''.join('[out%d]' % i for i in range(outputs))))
+        else:
+            chain.append('format=yuv420p[out]')
+        graph.append(','.join(chain))
+        return ['-filter_complex', ';'.join(graph)]
     else:
         return []
 
@@ -49,38 +69,158 @@ def build_x264_params(params):
 def build_nvenc_params(params):
     return [x for y in (('-%s' % k, conv_param_value(v)) for k, v in params.items()) for x in y]
 
+def encoder_params(config, nvenc):
+    compiled = config.get('compiled')
+    if compiled is not None:
+        return compiled['nvenc' if nvenc else 'x264']
+    return build_nvenc_params(config['nvenc']) if nvenc else build_x264_params(config['x264'])
+
+def override_params(params, nvenc, overrides):
+    """
+    Returns the given encoder parameters (as returned by encoder_params())
+    with the given options overriding those of the profile.
+    """
+    if len(overrides) == 0:
+        return params
+    if nvenc:
+        return params + build_nvenc_params(overrides)
+    extra = build_x264_params(overrides)[1]
+    return params[:-1] + [params[-1] + ':' + extra if len(params[-1]) > 0 else extra]
+
 def build_bitrates(r):
     return ['-b:v', '%dk' % r, '-maxrate', '%dk' % (r*2), '-bufsize', '%dk' % (r*1.5)]
 
-def ffmpeg(input_file, output_file, config, logo=None, subtitles=None, nvenc=False, **kwargs):
-    cmd = ['ffmpeg', '-y', '-v', 'info', '-thread_queue_size', '16', '-i', 'pipe:', '-i', input_file]
+def build_stream_options(output_file, stream, segment_time):
+    if stream == 'fmp4':
+        return ['-f', 'mp4', '-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+    elif stream == 'hls':
+        stem = os.path.splitext(os.path.basename(output_file))[0]
+        return [
+            '-force_key_frames', 'expr:gte(t,n_forced*%s)' % segment_time,
+            '-f', 'hls', '-hls_time', str(segment_time), '-hls_list_size', '0',
+            '-hls_playlist_type', 'event', '-hls_segment_type', 'fmp4',
+            '-hls_flags', 'temp_file+independent_segments',
+            '-hls_fmp4_init_filename', stem + '_init.mp4',
+            '-hls_segment_filename', os.path.join(os.path.dirname(output_file), stem + '_%05d.m4s')
+        ]
+    else:
+        return []
+
+def ffmpeg(input_file, output_file, config, logo=None, subtitles=None, nvenc=False, audio=True, offset=None, input_options=None, renditions=None, source='pipe:', stream=None, segment_time=6, threads=None, queue_size=16, lookahead=None, params=None, **kwargs):
+    # The -progress blocks go to stdout, which ffmpeg uses for nothing else as
+    # all outputs are files; this keeps them apart from the log on stderr
+    # while the followers only need to watch the two standard pipes
+    cmd = ['ffmpeg', '-y', '-v', 'info', '-nostats', '-progress', 'pipe:1', '-thread_queue_size', str(queue_size)]
+    if input_options is not None:
+        cmd.extend(input_options)
+    cmd.extend(['-i', source])
+
+    # The video is read from the input file itself when it needs no interpolation
+    n_inputs = 1
+    if source != input_file:
+        cmd.extend(['-i', input_file])
+        n_inputs += 1
+    audio_map = '%d:a' % (n_inputs - 1)
 
     if logo is not None:
         cmd.append('-i')
         cmd.append(logo)
 
-    f = build_filter(logo, subtitles)
-    if len(f) == 0:
-        cmd.extend(['-map', '0:v'])
-    else:
-        cmd.extend(f)
-        cmd.extend(['-map', '[out]'])
+    # Additional renditions are encoded from the same decoded (and filtered) frames
+    outputs = [(output_file, config)] + list(renditions or [])
 
-    cmd.extend(['-map', '1:a', '-pix_fmt', 'yuv420p', '-c:v', 'h264_nvenc' if nvenc else 'libx264'])
+    f = build_filter(logo, subtitles, offset, len(outputs), n_inputs)
+    cmd.extend(f)
 
-    cmd.extend(build_bitrates(config['v_bitrate']))
-    cmd.extend(['-profile:v', 'high', '-level', '4.2'])
+    for i, (output_file, config) in enumerate(outputs):
+        if len(f) == 0:
+            cmd.extend(['-map', '0:v:0'])
+        else:
+            cmd.extend(['-map', '[out]' if len(outputs) == 1 else '[out%d]' % i])
 
-    if nvenc:
-        cmd.extend(build_nvenc_params(config['nvenc']))
-    else:
-        cmd.extend(build_x264_params(config['x264']))
+        if audio:
+            cmd.extend(['-map', audio_map])
+        cmd.extend(['-pix_fmt', 'yuv420p', '-c:v', 'h264_nvenc' if nvenc else 'libx264'])
+
+        cmd.extend(build_bitrates(config['v_bitrate']))
+        cmd.extend(['-profile:v', 'high', '-level', '4.2'])
+
+        overrides = dict(params or {})
+        if threads is not None and not nvenc:
+            # Same split as x264's own default, but based on our budget instead of all cores
+            overrides['threads'] = threads
+            overrides['lookahead-threads'] = min(max(threads // 6, 1), 16)
+        if lookahead is not None and not nvenc:
+            overrides['rc-lookahead'] = min(lookahead, config['x264'].get('rc-lookahead', 40))
+        cmd.extend(override_params(encoder_params(config, nvenc), nvenc, overrides))
 
+        if audio:
+            cmd.extend(['-c:a', 'aac', '-b:a', '%dk' % config['a_bitrate']])
+        cmd.extend(build_stream_options(output_file, stream, segment_time))
+        cmd.append(output_file)
+
+    return subprocess.Popen(cmd, **kwargs)
+
+def ffremux(input_file, output_file, config, **kwargs):
+    cmd = ['ffmpeg', '-y', '-v', 'info', '-nostats', '-progress', 'pipe:1', '-i', input_file]
+    cmd.extend(['-map', '0:v:0', '-map', '0:a', '-c:v', 'copy'])
     cmd.extend(['-c:a', 'aac', '-b:a', '%dk' % config['a_bitrate']])
     cmd.append(output_file)
 
     return subprocess.Popen(cmd, **kwargs)
 
+def ffconcat(list_file, input_file, output_file, config, **kwargs):
+    cmd = ['ffmpeg', '-y', '-v', 'info', '-f', 'concat', '-safe', '0', '-i', list_file, '-i', input_file]
+    cmd.extend(['-map', '0:v', '-map', '1:a', '-c:v', 'copy'])
+    cmd.extend(['-c:a', 'aac', '-b:a', '%dk' % config['a_bitrate']])
+    cmd.append(output_file)
+
+    return subprocess.Popen(cmd, **kwargs)
+
+def build_hwaccel_options(hwaccel, device):
+    if hwaccel is None:
+        return []
+    # Frames stay on the device until the filter graph downloads them, so a
+    # decoder which cannot actually use the device fails instead of silently
+    # falling back to software
+    return ['-hwaccel', hwaccel, '-hwaccel_device', device, '-hwaccel_output_format', hwaccel]
+
+def build_download_filter(hwaccel, depth, showinfo=False):
+    if hwaccel is None:
+        return (['-vf', 'showinfo'] if showinfo else []) + ['-pix_fmt', 'yuv420p']
+    return ['-vf', 'hwdownload,format=%s,format=yuv420p' % ('p010' if depth > 8 else 'nv12') + (',showinfo' if showinfo else '')]
+
+def ffdecode(input_file, hwaccel=None, device=None, depth=8, start=None, threads=0, **kwargs):
+    """
+    Decodes the first video stream of the given file, starting at `start`
+    seconds, to raw YUV420P8 frames on stdout, either in software with
+    `threads` threads (0 for one per core) or with the given hwaccel. The
+    original timestamp of every frame is logged to stderr by showinfo, as
+    seeking does not necessarily land on the requested frame.
+    """
+    cmd = ['ffmpeg', '-v', 'info', '-nostats', '-nostdin', '-threads', str(threads)]
+    cmd.extend(build_hwaccel_options(hwaccel, device))
+    if start:
+        cmd.extend(['-ss', '%.6f' % start])
+    cmd.extend(['-copyts', '-i', input_file, '-map', '0:v:0', '-an', '-sn', '-vsync', 'passthrough'])
+    cmd.extend(build_download_filter(hwaccel, depth, True))
+    cmd.extend(['-f', 'rawvideo', '-'])
+
+    return subprocess.Popen(cmd, **kwargs)
+
+@cached(FFPROBE_CACHE, lambda input_file, hwaccel, device, depth=8: '%s|%s|%s|%s' % (file_key(input_file), hwaccel, device, binary_key('ffmpeg')))
+def ffhwdecode(input_file, hwaccel, device, depth=8):
+    """
+    Returns whether the given hwaccel can decode the first frames of the
+    given file.
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin']
+    cmd.extend(build_hwaccel_options(hwaccel, device))
+    cmd.extend(['-i', input_file, '-map', '0:v:0', '-an', '-sn', '-frames:v', '8'])
+    cmd.extend(build_download_filter(hwaccel, depth))
+    cmd.extend(['-f', 'null', '-'])
+    return subprocess.call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
 RE_DURATION_VALUE = re.compile(b'^(\d+\.\d+)|(\d+):(\d\d):(\d\d)(.\d+)$')
 def parse_duration(duration):
     m = RE_DURATION_VALUE.match(duration)
@@ -91,15 +231,17 @@ def parse_duration(duration):
     else:
         return int(m.group(2), 10) * 3600 + int(m.group(3), 10) * 60 + int(m.group(4), 10) + float(m.group(5))
 
+@cached(FFMPEG_CACHE, lambda: binary_key('ffmpeg'))
 def ffhwaccels():
     accels = []
     for info in subprocess.check_output(['ffmpeg', '-v', 'error', '-hwaccels']).split(ASCII_LINESEP):
         info = info.strip()
         if not len(info) == 0 and not info.startswith(b'Hardware '):
-            accels.append(info)
+            accels.append(info.decode('ascii'))
     return accels
 
 RE_VCODEC = re.compile(b'^\s\SEV\S\S\S\s+(\S+)\s+([^(]|\((?!decoders|encoders))*(\(decoders: ([^)]*)\)\s*)?(\(encoders: ([^)]*)\))?$')
+@cached(FFMPEG_CACHE, lambda: binary_key('ffmpeg'))
 def ffvcodecs():
     vcodecs = {}
     for info in subprocess.check_output(['ffmpeg', '-v', 'error', '-codecs']).split(ASCII_LINESEP):
@@ -113,11 +255,25 @@ def ffvcodecs():
 
 RE_DURATION = re.compile(b'^(TAG:DURATION|duration)=(\d+\.\d+|\d+:\d\d:\d\d.\d+)$')
 RE_FRAMERATE = re.compile(b'^r_frame_rate=(\d+)/(\d+)$')
+RE_AVG_FRAMERATE = re.compile(rb'^avg_frame_rate=(\d+)/(\d+)$')
+RE_START_TIME = re.compile(rb'^start_time=(-?\d+\.\d+)$')
 RE_N_FRAMES = re.compile(b'^(TAG:NUMBER_OF_FRAMES|nb_frames)=(\d+)$')
+RE_CODEC = re.compile(rb'^codec_name=(\S+)$')
+RE_SIZE = re.compile(rb'^(width|height)=(\d+)$')
+RE_PIX_FMT = re.compile(rb'^pix_fmt=(\S+)$')
+RE_DEPTH = re.compile(rb'^bits_per_raw_sample=(\d+)$')
+RE_PIX_FMT_DEPTH = re.compile(r'p(\d+)(le|be)$')
+@cached(FFPROBE_CACHE, lambda input_file: '%d|%s' % (FFPROBE_FORMAT, file_key(input_file)))
 def ffprobe(input_file):
     n_frames = None
     framerate = None
+    avg_framerate = None
+    start_time = None
     duration = None
+    codec = None
+    size = {}
+    pix_fmt = None
+    depth = None
     for info in subprocess.check_output(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_streams', input_file]).split(ASCII_LINESEP):
         m = RE_N_FRAMES.match(info)
         if m is not None:
@@ -127,14 +283,100 @@ def ffprobe(input_file):
         if m is not None:
             framerate = [int(m.group(1), 10), int(m.group(2), 10)]
             continue
+        m = RE_AVG_FRAMERATE.match(info)
+        if m is not None:
+            avg_framerate = [int(m.group(1), 10), int(m.group(2), 10)]
+            continue
+        m = RE_START_TIME.match(info)
+        if m is not None:
+            start_time = float(m.group(1))
+            continue
+        m = RE_CODEC.match(info)
+        if m is not None:
+            codec = m.group(1).decode('ascii')
+            continue
+        m = RE_SIZE.match(info)
+        if m is not None:
+            size[m.group(1)] = int(m.group(2), 10)
+            continue
+        m = RE_PIX_FMT.match(info)
+        if m is not None:
+            pix_fmt = m.group(1).decode('ascii')
+            continue
+        m = RE_DEPTH.match(info)
+        if m is not None:
+            depth = int(m.group(1), 10)
+            continue
         m = RE_DURATION.match(info)
         if m is not None:
             duration = parse_duration(m.group(2))
     if n_frames is None and framerate is not None:
         n_frames = duration * framerate[0] / framerate[1]
-    return {'nf': n_frames, 'r': framerate, 'd': duration}
+    if depth is None and pix_fmt is not None:
+        m = RE_PIX_FMT_DEPTH.search(pix_fmt)
+        depth = int(m.group(1), 10) if m is not None else 8
+    # The average rate of a constant rate stream is its base rate, give or take the rounding of the container
+    vfr = framerate is not None and avg_framerate is not None and avg_framerate[1] != 0 and \
+        abs(avg_framerate[0] * framerate[1] - framerate[0] * avg_framerate[1]) * 1000 > framerate[0] * avg_framerate[1]
+    return {'nf': n_frames, 'r': framerate, 'd': duration, 'c': codec, 'w': size.get(b'width'), 'h': size.get(b'height'), 'pf': pix_fmt, 'bd': depth, 'ts': start_time, 'vfr': vfr}
+
+RE_FRAME_DIFF = re.compile(rb'lavfi\.signalstats\.YAVG=(\d+(\.\d+)?)')
+@cached(FFPROBE_CACHE, lambda input_file, duration, windows=3, length=2: '%d|%s|%d|%d' % (FFPROBE_FORMAT, file_key(input_file), windows, length))
+def ffmotion(input_file, duration, windows=3, length=2):
+    """
+    Returns the mean absolute difference (0-255) between consecutive
+    downscaled luma frames in a few short windows spread across the input,
+    as a cheap measure of how much motion it contains.
+    """
+    diffs = []
+    for i in range(windows):
+        start = max(duration - length, 0) * (i + 1) / (windows + 1)
+        output = subprocess.check_output([
+            'ffmpeg', '-v', 'info', '-nostats', '-ss', '%.3f' % start, '-t', str(length), '-i', input_file, '-map', '0:v:0', '-an',
+            '-vf', 'scale=160:-2,tblend=all_mode=difference,signalstats,metadata=mode=print:key=lavfi.signalstats.YAVG',
+            '-f', 'null', '-'
+        ], stderr=subprocess.STDOUT)
+        diffs.extend(float(m.group(1)) for m in RE_FRAME_DIFF.finditer(output))
+    return round(sum(diffs) / len(diffs), 3) if len(diffs) > 0 else 0.0
+
+RE_FRAME_STATS = re.compile(rb'lavfi\.signalstats\.(YAVG|YMAX)=(\d+(\.\d+)?)')
+@cached(FRAMEMAP_CACHE, lambda input_file, avg, peak: '%s|%s|%s' % (file_key(input_file), avg, peak))
+def ffdupes(input_file, avg, peak):
+    """
+    Finds the frames which (nearly) repeat their predecessor: those whose
+    downscaled luma differs from the previous frame's by less than `avg` on
+    average and by less than `peak` at any pixel (0-255). Returns them as a
+    list of [first, last] runs of frame numbers.
+    """
+    p = subprocess.Popen([
+        'ffmpeg', '-v', 'info', '-nostats', '-nostdin', '-threads', '0', '-i', input_file, '-map', '0:v:0', '-an', '-sn', '-vsync', 'passthrough',
+        '-vf', 'scale=160:-2:flags=area,tblend=all_mode=difference,signalstats,'
+            'metadata=mode=print:key=lavfi.signalstats.YAVG,metadata=mode=print:key=lavfi.signalstats.YMAX',
+        '-f', 'null', '-'
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    runs = []
+    n = 0 # tblend's first output compares frames 0 and 1
+    mean = None
+    for line in p.stderr:
+        m = RE_FRAME_STATS.search(line)
+        if m is None:
+            continue
+        if m.group(1) == b'YAVG':
+            mean = float(m.group(2))
+            continue
+        n += 1
+        if mean is not None and mean < avg and float(m.group(2)) < peak:
+            if len(runs) > 0 and runs[-1][1] == n - 1:
+                runs[-1][1] = n
+            else:
+                runs.append([n, n])
+        mean = None
+    if p.wait() != 0:
+        raise subprocess.CalledProcessError(p.returncode, 'ffmpeg')
+    return runs
 
 RE_VERSION = re.compile(b'^ffmpeg version (\S+)')
+@cached(FFMPEG_CACHE, lambda: binary_key('ffmpeg'))
 def ffversion():
     version = None
     for info in subprocess.check_output(['ffmpeg', '-version']).split(ASCII_LINESEP):
@@ -144,18 +386,48 @@ def ffversion():
             break
     return version
 
-RE_PROGRESS = re.compile(b'^frame=\s*(\S+)\s*fps=\s*(\S+)\s*q=\s*(\S+)\s*size=\s*(\S+)\s*time=\s*(\S+)\s*bitrate=\s*(\S+)\s*speed=\s*(\S+)\s*$')
-def parse_progress(data):
-    m = RE_PROGRESS.match(data)
+RE_OPENING = re.compile(b"^\\[\\w+ @ [0-9a-fx]+\\] Opening '(.+)' for writing$")
+def parse_opening(data):
+    m = RE_OPENING.match(data)
     if m is not None:
-        return {
-            'f': int(m.group(1), 10),
-            'fps': float(m.group(2)),
-            'q': float(m.group(3)),
-            'sz': m.group(4).decode('ascii'),
-            't': parse_duration(m.group(5)),
-            'br': m.group(6).decode('ascii'),
-            'spd': m.group(7).decode('ascii')
-        }
+        return m.group(1).decode('utf-8', 'replace')
     else:
         return None
+
+RE_SSIM = re.compile(b'^\\[libx264 @ [0-9a-fx]+\\] SSIM Mean Y:(\\d+\\.\\d+)')
+def parse_ssim(data):
+    m = RE_SSIM.match(data)
+    if m is not None:
+        return float(m.group(1))
+    else:
+        return None
+
+class SegmentTracker(object):
+    """
+    Follows the "Opening ... for writing" lines which ffmpeg's HLS muxer logs
+    at info level. A media segment is complete (and, with the `temp_file` flag,
+    renamed to its final name) once the muxer opens the next segment of the
+    same output. `feed()` returns the names of segments published by the given
+    stderr line, `finish()` those still open when ffmpeg exited successfully.
+    """
+    def __init__(self):
+        self.__open = {}
+
+    def feed(self, data):
+        fn = parse_opening(data)
+        if fn is None:
+            return []
+        if fn.endswith('.tmp'):
+            fn = fn[:-4]
+        stem, ext = os.path.splitext(fn)
+        if ext not in ('.m4s', '.ts'):
+            return []
+        key = (stem.rstrip('0123456789'), ext)
+        last = self.__open.get(key)
+        self.__open[key] = fn
+        return [last] if last is not None and last != fn else []
+
+    def finish(self):
+        published = list(self.__open.values())
+        self.__open.clear()
+        return published
@@ -0,0 +1,75 @@
+#
+#  memory_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+__all__ = ['parse_size', 'frame_bytes', 'plan_memory']
+
+MiB = 1024**2
+
+# Rough per-process estimates; frame-sized buffers are scaled by the probed resolution
+VS_BASE = 256 * MiB      # Interpreter, plugins and ffms2's decoder
+VS_MIN_CACHE = 128 * MiB # Below this the frame cache starts thrashing
+VS_MAX_CACHE = 4096 * MiB # VapourSynth's own default on 64-bit systems
+FF_BASE = 64 * MiB       # ffmpeg itself, the filter graph and the muxer
+SUPER_FACTOR = 16 / 3    # SVP super clip at pel=2 including its pyramid
+SUPER_PER_THREAD = 4     # Super frames referenced by each SVP request
+X264_FACTOR = 3          # Planes, half-pel luma and lowres copies per x264 frame
+
+def parse_size(spec):
+    """
+    Parses a size in bytes with an optional K, M, G or T suffix (powers of
+    1024), e.g. "6G".
+    """
+    spec = spec.strip().upper().rstrip('B')
+    units = 'KMGT'
+    if len(spec) > 0 and spec[-1] in units:
+        return int(float(spec[:-1]) * 1024**(units.index(spec[-1]) + 1))
+    return int(spec)
+
+def frame_bytes(width, height, depth=8):
+    return width * height * 3 // 2 * ((depth + 7) // 8)
+
+def estimate(fb, vs_threads, cache, encoders, reader=0):
+    vs = VS_BASE + cache + int(vs_threads * SUPER_PER_THREAD * SUPER_FACTOR * fb) + reader * fb
+    ff = FF_BASE + sum(queue * fb + frames * X264_FACTOR * fb for queue, frames in encoders)
+    return vs, ff
+
+def plan_memory(budget, fb, vs_threads, encoders, queue_size=16, reader=0):
+    """
+    Fits a pipeline into `budget` bytes. `fb` is the size of a frame,
+    `encoders` a list of (threads, lookahead, buffered frames) tuples, one
+    per output, and `reader` the number of frames kept by the FrameReader of
+    an ffmpeg or VAAPI decoder, if any. The VapourSynth cache gets whatever
+    is left after the fixed costs; if that is not enough, the input queue and
+    then the lookahead of all encoders are shortened. Returns a dict with the VapourSynth cache in
+    MiB (`cache`), the input queue size (`queue`), the lookahead (`la`) and
+    the estimated peak (`est`) in bytes, or None if even the smallest
+    settings do not fit.
+    """
+    lookahead = max(la for _, la, _ in encoders)
+    while True:
+        frames = [threads + min(la, lookahead) + buffered for threads, la, buffered in encoders]
+        vs, ff = estimate(fb, vs_threads, 0, [(queue_size, n) for n in frames], reader)
+        cache = budget - vs - ff
+        if cache >= VS_MIN_CACHE:
+            break
+        if queue_size > 4:
+            queue_size //= 2
+        elif lookahead > 10:
+            lookahead = max(lookahead // 2, 10)
+        else:
+            return None
+
+    cache = min(cache, VS_MAX_CACHE)
+    return {
+        'cache': cache // MiB,
+        'queue': queue_size,
+        'la': lookahead,
+        'est': vs + ff + cache
+    }
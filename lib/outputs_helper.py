@@ -0,0 +1,105 @@
+#
+#  outputs_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, sys, json, shutil, hashlib
+from .cache_helper import cache_dir, evict_lru
+
+if sys.platform.startswith('linux'):
+    import fcntl
+else:
+    fcntl = None
+
+__all__ = ['OutputCache', 'fingerprint', 'output_cache_dir']
+
+OUTPUT_FORMAT = 1
+SAMPLE_BLOCKS = 16
+SAMPLE_SIZE = 64 * 1024
+FICLONE = 0x40049409 # Linux ioctl sharing another file's extents copy-on-write (Btrfs, XFS)
+
+def output_cache_dir():
+    return os.path.join(cache_dir(), 'outputs')
+
+def fingerprint(path):
+    """
+    Returns a hash of the given file's size, mtime and `SAMPLE_BLOCKS` blocks
+    of `SAMPLE_SIZE` bytes spread evenly across it (including the first and
+    the last one), which is enough to tell apart different encodes without
+    reading the whole file.
+    """
+    st = os.stat(path)
+    h = hashlib.sha256(b'%d:%d' % (st.st_size, st.st_mtime_ns))
+    with open(path, 'rb') as f:
+        span = max(st.st_size - SAMPLE_SIZE, 0)
+        for i in range(SAMPLE_BLOCKS):
+            f.seek(span * i // (SAMPLE_BLOCKS - 1))
+            h.update(f.read(SAMPLE_SIZE))
+    return h.hexdigest()
+
+def clone(source, dest):
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError: # Different file system or no reflink support
+        return False
+
+def clone_or_copy(source, dest):
+    tmp = '%s.%d.part' % (dest, os.getpid())
+    try:
+        if not clone(source, tmp):
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+class OutputCache(object):
+    """
+    Stores finished outputs under a key computed from everything that went
+    into them. Results are cloned (or copied, where the file system cannot
+    share extents) in and out of the cache directory, so editing an output
+    never touches the cache, which is kept below `max_bytes` by evicting the
+    least recently used files.
+    """
+    def __init__(self, directory=None, max_bytes=64 * 1024**3):
+        self.directory = directory if directory is not None else output_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key(self, parts):
+        return hashlib.sha256(json.dumps([OUTPUT_FORMAT, parts], sort_keys=True, separators=(',',':')).encode('utf-8')).hexdigest()
+
+    def __paths(self, key, outputs):
+        return [os.path.join(self.directory, '%s.%d%s' % (key, i, os.path.splitext(fn)[1])) for i, fn in enumerate(outputs)]
+
+    def fetch(self, key, outputs):
+        """
+        Puts the cached results for the given key at the given output paths
+        and returns True, or returns False if any of them is missing.
+        """
+        paths = self.__paths(key, outputs)
+        try:
+            for path in paths:
+                os.utime(path)
+            for path, fn in zip(paths, outputs):
+                clone_or_copy(path, fn)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, outputs):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for path, fn in zip(self.__paths(key, outputs), outputs):
+                clone_or_copy(fn, path)
+        except OSError:
+            return
+        evict_lru(self.directory, self.max_bytes)
@@ -8,27 +8,49 @@
 #  Licensed under the EUPL
 #
 
-import sys, os
+import sys, os, re, asyncio, threading
 
-__all__ = ['ProcessFollower']
+__all__ = ['ProcessFollower', 'AsyncProcessFollower', 'LineSplitter']
 
-def find_line(buf):
-    r = buf.find(b'\r')
-    n = buf.find(b'\n')
-    if r == -1 and n == -1:
-        return
+RE_LINESEP = re.compile(b'\r\n?|\n')
 
-    if r == -1 or (n != -1 and r > n):
-        line = bytes(buf[:n])
-        buf[:] = buf[(n+1):]
-    elif n == -1 or (r != -1 and n > r):
-        line = bytes(buf[:r])
-        if n == r+1:
-            buf[:] = buf[(r+2):]
-        else:
-            buf[:] = buf[(r+1):]
+class LineSplitter(object):
+    """
+    Incremental splitter for \\n, \\r\\n and lone \\r terminated lines. Data is
+    fed in chunks and complete lines are yielded by iterating over the object.
+    Consumed data is skipped with an offset and only compacted occasionally,
+    which keeps splitting linear in the amount of data.
+    """
+    def __init__(self):
+        self.__buf = bytearray()
+        self.__pos = 0
+        self.__cr = False
 
-    return line
+    def feed(self, data):
+        self.__buf.extend(data)
+
+    def __iter__(self):
+        buf = self.__buf
+        while True:
+            if self.__cr and self.__pos < len(buf): # \r\n split across two chunks
+                if buf[self.__pos] == 0x0a:
+                    self.__pos += 1
+                self.__cr = False
+
+            m = RE_LINESEP.search(buf, self.__pos)
+            if m is None:
+                break
+            line = bytes(buf[self.__pos:m.start()])
+            self.__pos = m.end()
+            self.__cr = m.end() == len(buf) and buf[-1] == 0x0d
+            yield line
+
+        if self.__pos == len(buf):
+            buf.clear()
+            self.__pos = 0
+        elif self.__pos >= 65536 and self.__pos * 2 >= len(buf):
+            del buf[:self.__pos]
+            self.__pos = 0
 
 if sys.platform == 'darwin' or sys.platform.startswith('freebsd'):
     import select, fcntl
@@ -54,8 +76,8 @@ if sys.platform == 'darwin' or sys.platform.startswith('freebsd'):
             ], 0, 0)
 
         def __iter__(self):
-            stdout_buf = bytearray()
-            stderr_buf = bytearray()
+            stdout_buf = LineSplitter()
+            stderr_buf = LineSplitter()
             while True:
                 kevs = self.__kq.control(None, 3, None)
                 for kev in kevs:
@@ -77,18 +99,14 @@ if sys.platform == 'darwin' or sys.platform.startswith('freebsd'):
 
                     try:
                         while True:
-                            buf.extend(os.read(kev.ident, 8192))
+                            buf.feed(os.read(kev.ident, 8192))
                             if self.__proc.poll() is not None:
                                 break
                     except BlockingIOError:
                         pass
 
-                    while True:
-                        line = find_line(buf)
-                        if line is None:
-                            break
-                        else:
-                            yield stderr, line
+                    for line in buf:
+                        yield stderr, line
 elif sys.platform.startswith('linux'):
     import select, fcntl
 
@@ -110,8 +128,9 @@ elif sys.platform.startswith('linux'):
             self.__ep.register(self.__stderr_fd, select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP)
 
         def __iter__(self):
-            stdout_buf = bytearray()
-            stderr_buf = bytearray()
+            stdout_buf = LineSplitter()
+            stderr_buf = LineSplitter()
+            n_open = 2
             while True:
                 for fd, event in self.__ep.poll():
                     if event == select.EPOLLERR or event == select.EPOLLHUP:
@@ -129,18 +148,24 @@ elif sys.platform.startswith('linux'):
 
                     try:
                         while True:
-                            buf.extend(os.read(fd, 8192))
+                            data = os.read(fd, 8192)
+                            if len(data) == 0: # EOF arrives together with EPOLLIN, stop polling this pipe
+                                self.__ep.unregister(fd)
+                                n_open -= 1
+                                break
+                            buf.feed(data)
                     except BlockingIOError:
                         pass
 
-                    while True:
-                        line = find_line(buf)
-                        if line is None:
-                            break
-                        else:
-                            yield stderr, line
+                    for line in buf:
+                        yield stderr, line
+
+                if n_open == 0:
+                    self.__ep.close()
+                    self.__proc.stdout.close()
+                    self.__proc.stderr.close()
+                    return
 else:
-    import threading
     from queue import Queue
 
     class ThreadedLineReader(threading.Thread):
@@ -151,26 +176,15 @@ else:
             self.__stderr = stderr
 
         def run(self):
-            buf = bytearray()
-            cr = False
+            buf = LineSplitter()
             while True:
-                b = self.__f.read(1)
+                b = self.__f.read1(8192)
                 if len(b) == 0:
                     self.__q.put( (self.__stderr, None) )
                     break
-                if b == b'\n':
-                    if cr:
-                        cr = False
-                    else:
-                        self.__q.put( (self.__stderr, bytes(buf)) )
-                        buf.clear()
-                elif b == b'\r':
-                    cr = True
-                    self.__q.put( (self.__stderr, bytes(buf)) )
-                    buf.clear()
-                else:
-                    cr = False
-                    buf.extend(b)
+                buf.feed(b)
+                for line in buf:
+                    self.__q.put( (self.__stderr, line) )
 
     class ProcessFollower(object):
         """
@@ -196,3 +210,72 @@ else:
                     return
                 else:
                     yield stderr, line
+
+class LineProtocol(asyncio.Protocol):
+    def __init__(self, queue, key, stderr):
+        self.__queue = queue
+        self.__key = key
+        self.__stderr = stderr
+        self.__buf = LineSplitter()
+
+    def data_received(self, data):
+        self.__buf.feed(data)
+        for line in self.__buf:
+            self.__queue.put_nowait( (self.__key, self.__stderr, line) )
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        self.__queue.put_nowait( (self.__key, self.__stderr, None) )
+
+class AsyncProcessFollower(object):
+    """
+    Utility class for following the stdout and stderr pipes of any number of
+    processes from a single asyncio event loop. Processes are added with the
+    `follow()` coroutine; pipes that are not set up or already closed in this
+    process are skipped. Objects of this class are to be iterated over with
+    `async for` and will yield a tuple of the key given to `follow()` (the
+    process itself by default), a boolean which is true for stderr (and false
+    for stdout) and a byte sequence with the line data. Iteration ends when
+    all pipes have been closed.
+    """
+    def __init__(self):
+        self.__queue = None
+        self.__open = 0
+
+    async def follow(self, proc, key=None):
+        loop = asyncio.get_event_loop()
+        if self.__queue is None:
+            self.__queue = asyncio.Queue()
+        if key is None:
+            key = proc
+        for f, stderr in ((proc.stdout, False), (proc.stderr, True)):
+            if f is None or f.closed:
+                continue
+            self.__open += 1
+            if sys.platform == 'win32': # Proactor pipes need overlapped handles
+                threading.Thread(target=self.__read_thread, args=(loop, f, key, stderr), daemon=True).start()
+            else:
+                await loop.connect_read_pipe(lambda: LineProtocol(self.__queue, key, stderr), f)
+
+    def __read_thread(self, loop, f, key, stderr):
+        protocol = LineProtocol(self.__queue, key, stderr)
+        while True:
+            b = f.read1(8192)
+            if len(b) == 0:
+                break
+            loop.call_soon_threadsafe(protocol.data_received, b)
+        loop.call_soon_threadsafe(protocol.connection_lost, None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self.__open > 0:
+            key, stderr, line = await self.__queue.get()
+            if line is None:
+                self.__open -= 1
+            else:
+                return key, stderr, line
+        raise StopAsyncIteration
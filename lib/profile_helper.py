@@ -0,0 +1,68 @@
+#
+#  profile_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+from .cache_helper import Cache
+from .vspipe_helper import build_svp_config
+from .ffmpeg_helper import build_x264_params, build_nvenc_params
+
+__all__ = ['PROFILE_CACHE', 'PROFILE_FORMAT', 'compile_profile', 'auto_settings']
+
+PROFILE_CACHE = Cache('profiles', 16)
+PROFILE_FORMAT = 1
+
+def compile_profile(profile):
+    """
+    Adds the ready-to-use vspipe arguments and encoder parameters of a
+    resolved profile under the `compiled` key and returns the profile.
+    """
+    profile['compiled'] = {
+        'analyse': build_svp_config(profile['analyse']),
+        'smooth': build_svp_config(profile['smooth']),
+        'x264': build_x264_params(profile['x264']),
+        'nvenc': build_nvenc_params(profile['nvenc'])
+    }
+    return profile
+
+def auto_settings(auto, info, motion):
+    """
+    Returns profile settings for the `auto` profile, derived from the probed
+    input and its motion measure as returned by ffmotion(). The block size is
+    the smallest one that keeps the number of blocks per frame below
+    `auto['blocks']` (fewer for high-motion content, more for static
+    content), so analyse costs roughly the same per frame at any resolution;
+    larger blocks are refined down one step. Large frames get cheaper x264
+    motion search settings to keep the encoder in step.
+    """
+    pixels = info['w'] * info['h']
+    budget = auto.get('blocks', 8160)
+    if motion is None: # Not measured, assume average content
+        pass
+    elif motion >= auto.get('high_motion', 12):
+        budget //= 2
+    elif motion < auto.get('low_motion', 3):
+        budget *= 2
+
+    width = 32
+    for w in (8, 16):
+        if pixels // (w * w) <= budget:
+            width = w
+            break
+    settings = {
+        'analyse': {
+            'block': {
+                'w': width,
+                'overlap': 3 if pixels // (width * width) <= budget // 2 else 2
+            },
+            'refine': [{'thsad': 200}] if width > 8 else []
+        }
+    }
+    if pixels > 1920 * 1088:
+        settings['x264'] = {'me': 'hex', 'merange': 24, 'subme': 7, 'trellis': 1}
+    return settings
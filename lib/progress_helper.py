@@ -0,0 +1,112 @@
+#
+#  progress_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import time
+
+__all__ = ['ProgressParser', 'ProgressReporter']
+
+def conv_int(v):
+    try:
+        return int(v, 10)
+    except ValueError:
+        return None
+
+def conv_float(v):
+    try:
+        return float(v)
+    except ValueError:
+        return None
+
+class ProgressParser(object):
+    """
+    Parser for the key=value blocks written by ffmpeg's `-progress` option.
+    Lines are fed one by one; when a block is complete, `feed()` returns a
+    dict with the frame number (`f`), frame rate (`fps`), quantizer (`q`),
+    size (`sz`), time (`t`), bitrate (`br`) and speed (`spd`) plus the
+    duplicated (`dup`) and dropped (`drop`) frame counts, otherwise None.
+    """
+    def __init__(self):
+        self.__block = {}
+
+    def feed(self, line):
+        key, sep, value = line.partition(b'=')
+        if len(sep) == 0:
+            return None
+        key = key.strip()
+        value = value.strip()
+        if key != b'progress':
+            self.__block[key] = value
+            return None
+
+        block = self.__block
+        self.__block = {}
+        size = conv_int(block.get(b'total_size', b'N/A'))
+        time_us = conv_int(block.get(b'out_time_us', block.get(b'out_time_ms', b'N/A')))
+        return {
+            'f': conv_int(block.get(b'frame', b'0')),
+            'fps': conv_float(block.get(b'fps', b'0')),
+            'q': conv_float(block.get(b'stream_0_0_q', b'N/A')),
+            'sz': '%dkB' % (size // 1024) if size is not None else 'N/A',
+            't': time_us / 1000000 if time_us is not None else None,
+            'br': block.get(b'bitrate', b'N/A').decode('ascii'),
+            'spd': block.get(b'speed', b'N/A').decode('ascii'),
+            'dup': conv_int(block.get(b'dup_frames', b'0')),
+            'drop': conv_int(block.get(b'drop_frames', b'0'))
+        }
+
+class ProgressReporter(object):
+    """
+    Merges progress updates into the given info dict and hands it to `emit`
+    at most once every `interval` seconds. Adds an exponentially smoothed
+    frame rate (`sfps`) and, if the info dict contains the expected number of
+    output frames (`nft`), the estimated remaining time in seconds (`eta`).
+    Call `flush()` at the end to emit a pending update.
+    """
+    def __init__(self, info, emit, interval=1.0, smoothing=0.3, clock=time.monotonic):
+        self.__info = info
+        self.__emit = emit
+        self.__interval = interval
+        self.__smoothing = smoothing
+        self.__clock = clock
+        self.__sample = None
+        self.__sfps = None
+        self.__emitted = None
+        self.__pending = False
+
+    def update(self, progress):
+        self.__info.update(progress)
+        self.__pending = True
+
+        now = self.__clock()
+        frame = self.__info.get('f')
+        if frame is not None:
+            if self.__sample is not None and now > self.__sample[0]:
+                fps = (frame - self.__sample[1]) / (now - self.__sample[0])
+                if self.__sfps is None:
+                    self.__sfps = fps
+                else:
+                    self.__sfps += self.__smoothing * (fps - self.__sfps)
+            self.__sample = (now, frame)
+
+        if self.__emitted is None or now - self.__emitted >= self.__interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        if not self.__pending:
+            return
+        info = self.__info
+        if self.__sfps is not None:
+            info['sfps'] = round(self.__sfps, 2)
+            nft = info.get('nft')
+            if nft is not None and self.__sfps > 0:
+                info['eta'] = round(max(nft - (info.get('f') or 0), 0) / self.__sfps, 1)
+        self.__emitted = self.__clock() if now is None else now
+        self.__pending = False
+        self.__emit(info)
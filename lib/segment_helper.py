@@ -0,0 +1,103 @@
+#
+#  segment_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, json, subprocess
+from fractions import Fraction
+
+__all__ = ['ffkeyframes', 'plan_segments', 'plan_windows', 'write_concat_list', 'load_checkpoint', 'save_checkpoint']
+
+ASCII_LINESEP = os.linesep.encode('ascii')
+
+def ffkeyframes(input_file, framerate):
+    """
+    Returns the sorted frame numbers of all keyframes of the first video stream
+    by looking at packet flags only (no decoding takes place). The frame
+    numbers are derived from the presentation timestamps and the given frame
+    rate, which is a [num, den] pair as returned by ffprobe().
+    """
+    fps = Fraction(framerate[0], framerate[1])
+    keyframes = set()
+    start = None
+    for info in subprocess.check_output(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_file]).split(ASCII_LINESEP):
+        fields = info.strip().split(b',')
+        if len(fields) < 2 or b'K' not in fields[1]:
+            continue
+        try:
+            t = Fraction(fields[0].decode('ascii'))
+        except ValueError:
+            continue
+        if start is None or t < start:
+            start = t
+        keyframes.add(t)
+    return sorted(int((t - start) * fps + Fraction(1, 2)) for t in keyframes)
+
+def plan_segments(keyframes, n_frames, count, min_frames=1):
+    """
+    Splits the frame range [0, n_frames) into at most `count` segments whose
+    boundaries are placed on the keyframes closest to an even split. Returns a
+    list of (first, last) tuples with `last` being exclusive.
+    """
+    n_frames = int(n_frames)
+    bounds = [0]
+    candidates = [k for k in keyframes if 0 < k < n_frames]
+    for i in range(1, count):
+        ideal = n_frames * i // count
+        if len(candidates) == 0:
+            break
+        k = min(candidates, key=lambda k: abs(k - ideal))
+        if k - bounds[-1] >= min_frames and n_frames - k >= min_frames:
+            bounds.append(k)
+            candidates = [c for c in candidates if c > k]
+    bounds.append(n_frames)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def plan_windows(keyframes, n_frames, count, length):
+    """
+    Picks up to `count` windows of `length` frames spread evenly across the
+    frame range [0, n_frames), each starting on the keyframe closest to its
+    ideal position. Returns a sorted list of (first, last) tuples with `last`
+    being exclusive.
+    """
+    n_frames = int(n_frames)
+    length = min(length, n_frames)
+    candidates = [k for k in keyframes if k + length <= n_frames]
+    starts = set()
+    for i in range(count):
+        ideal = (n_frames - length) * (2 * i + 1) // (2 * count)
+        starts.add(min(candidates, key=lambda k: abs(k - ideal)) if len(candidates) > 0 else ideal)
+    return [(k, k + length) for k in sorted(starts)]
+
+def write_concat_list(path, files):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('ffconcat version 1.0\n')
+        for fn in files:
+            f.write("file '%s'\n" % os.path.abspath(fn).replace("'", "'\\''"))
+
+def load_checkpoint(path, job):
+    """
+    Returns the checkpoint stored at the given path if it belongs to the given
+    job description (input fingerprint, resolved profile, etc.), else None.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(checkpoint, dict) or checkpoint.get('job') != job:
+        return None
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, separators=(',',':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,218 @@
+#
+#  telemetry_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, sys, time, threading, subprocess
+
+__all__ = ['PipelineTelemetry', 'proc_stat', 'proc_rss']
+
+if sys.platform.startswith('linux'):
+    import fcntl, termios
+    CLK_TCK = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+    F_GETPIPE_SZ = 1032
+else:
+    fcntl = None
+
+def proc_stat(pid):
+    """
+    Returns a dict with the consumed CPU time in seconds (`cpu`), the resident
+    set size in bytes (`rss`), the number of threads (`th`) and the state
+    letter (`st`) of the given process, or None if it is not available.
+    """
+    try:
+        with open('/proc/%d/stat' % pid, 'rb') as f:
+            stat = f.read()
+        with open('/proc/%d/statm' % pid, 'rb') as f:
+            statm = f.read().split()
+    except OSError:
+        return None
+    fields = stat[(stat.rindex(b')') + 2):].split()
+    return {
+        'cpu': (int(fields[11]) + int(fields[12])) / CLK_TCK,
+        'rss': int(statm[1]) * PAGE_SIZE,
+        'th': int(fields[17]),
+        'st': fields[0].decode('ascii')
+    }
+
+def proc_rss(pids):
+    """
+    Returns the total resident set size in bytes of the given processes that
+    are still running, or None where /proc is not available.
+    """
+    if fcntl is None:
+        return None
+    total = 0
+    for pid in pids:
+        stat = proc_stat(pid)
+        if stat is not None:
+            total += stat['rss']
+    return total
+
+def proc_wchar(pid):
+    try:
+        with open('/proc/%d/io' % pid, 'rb') as f:
+            for line in f:
+                if line.startswith(b'wchar:'):
+                    return int(line[6:])
+    except OSError:
+        pass
+    return None
+
+class PipelineTelemetry(threading.Thread):
+    """
+    Samples the frame source (vspipe or the in-process engine) and the ffmpeg
+    encoder of a pipeline from /proc (Linux only): CPU usage, RSS and thread
+    count every `interval` seconds, and the fill level of the pipe between
+    them every `pipe_interval` seconds. Periodic records are passed to `emit`
+    as {'tm': {...}}; `stop()` emits a summary as {'tms': {...}}. Any `extra`
+    keys are added to both.
+    """
+    def __init__(self, source, encoder, emit, interval=5.0, pipe_interval=0.05, extra=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.__source = source
+        self.__emit = emit
+        self.__interval = interval
+        self.__pipe_interval = pipe_interval
+        self.__extra = extra or {}
+        self.__stopped = threading.Event()
+        self.__pids = {
+            'vs': source.pid if isinstance(source, subprocess.Popen) else os.getpid(),
+            'ff': encoder.pid
+        }
+        self.__peak_rss = {'vs': 0, 'ff': 0}
+        self.__first = {}
+        self.__latest = {}
+        self.__last = {}
+        self.__pipe_fd = None
+        self.__pipe_size = 65536
+        self.__pipe_samples = [0, 0, 0] # empty, partial, full
+        self.__last_bytes = None
+        self.__start_bytes = self.__bytes()
+        self.__start_time = time.monotonic()
+
+    def __bytes(self):
+        if isinstance(self.__source, subprocess.Popen):
+            b = proc_wchar(self.__source.pid)
+        else:
+            b = getattr(self.__source, 'bytes_written', None)
+        if b is not None:
+            self.__last_bytes = b
+        return self.__last_bytes
+
+    def __open_pipe(self):
+        try:
+            self.__pipe_fd = os.open('/proc/%d/fd/0' % self.__pids['ff'], os.O_RDONLY | os.O_NONBLOCK)
+            self.__pipe_size = fcntl.fcntl(self.__pipe_fd, F_GETPIPE_SZ)
+        except OSError:
+            self.__close_pipe()
+
+    def __close_pipe(self):
+        if self.__pipe_fd is not None:
+            os.close(self.__pipe_fd)
+            self.__pipe_fd = None
+
+    def __sample_procs(self):
+        now = time.monotonic()
+        alive = set()
+        for name, pid in self.__pids.items():
+            stat = proc_stat(pid)
+            if stat is None or stat['st'] in 'ZX':
+                continue
+            stat['t'] = now
+            self.__first.setdefault(name, stat)
+            self.__latest[name] = stat
+            self.__peak_rss[name] = max(self.__peak_rss[name], stat['rss'])
+            alive.add(name)
+        return alive
+
+    def __sample_pipe(self):
+        # Our extra reader must go away with the encoder, or the source
+        # would never see a broken pipe
+        if 'ff' not in self.__sample_procs():
+            self.__close_pipe()
+            return False
+        if self.__pipe_fd is not None:
+            try:
+                queued = int.from_bytes(fcntl.ioctl(self.__pipe_fd, termios.FIONREAD, b'\0\0\0\0'), sys.byteorder)
+            except OSError:
+                self.__close_pipe()
+                return True
+            if queued == 0:
+                self.__pipe_samples[0] += 1
+            elif queued + 4096 >= self.__pipe_size:
+                self.__pipe_samples[2] += 1
+            else:
+                self.__pipe_samples[1] += 1
+        return True
+
+    def __sample(self):
+        record = {}
+        for name, stat in self.__latest.items():
+            last = self.__last.get(name)
+            self.__last[name] = stat
+            record[name] = {
+                'cpu': round((stat['cpu'] - last['cpu']) / (stat['t'] - last['t']), 2) if last is not None and stat['t'] > last['t'] else None,
+                'rss': stat['rss'],
+                'th': stat['th']
+            }
+        record['pipe'] = self.__pipe_record(time.monotonic())
+        return record
+
+    def __pipe_record(self, now):
+        record = {}
+        n = sum(self.__pipe_samples)
+        if n > 0:
+            record['empty'] = round(self.__pipe_samples[0] / n, 3)
+            record['full'] = round(self.__pipe_samples[2] / n, 3)
+        b = self.__bytes()
+        if b is not None and self.__start_bytes is not None:
+            record['b'] = b - self.__start_bytes
+            if now > self.__start_time:
+                record['bps'] = int(record['b'] / (now - self.__start_time))
+        return record
+
+    def run(self):
+        if fcntl is None:
+            return
+        self.__open_pipe()
+        self.__sample_procs()
+        self.__sample()
+        next_sample = time.monotonic() + self.__interval
+        while not self.__stopped.wait(self.__pipe_interval):
+            if not self.__sample_pipe():
+                break
+            if time.monotonic() >= next_sample:
+                record = dict(self.__extra)
+                record['tm'] = self.__sample()
+                self.__emit(record)
+                next_sample += self.__interval
+        self.__close_pipe()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.is_alive():
+            self.join()
+        if fcntl is None:
+            return
+
+        now = time.monotonic()
+        summary = {}
+        for name, last in self.__latest.items():
+            first = self.__first[name]
+            summary[name] = {
+                'cpu': round(last['cpu'] - first['cpu'], 2),
+                'rss': self.__peak_rss[name],
+                'th': last['th']
+            }
+        summary['pipe'] = self.__pipe_record(now)
+        summary['d'] = round(now - self.__start_time, 2)
+        record = dict(self.__extra)
+        record['tms'] = summary
+        self.__emit(record)
@@ -0,0 +1,180 @@
+#
+#  vectors_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, sys, json, mmap, atexit, ctypes, struct, hashlib, threading
+from .cache_helper import cache_dir, file_key, evict_lru
+
+__all__ = ['VectorStore', 'vectors_key']
+
+MAGIC = b'DSVPVEC1'
+ALIGN = 4096
+
+def vectors_key(input_file, analyse_config, gpu, decoder, start=None, end=None):
+    """
+    Returns the content address of the motion vectors for the given input file
+    (path, size and mtime), analyse configuration, decoder and source frame
+    range. Decoders may number or round the frames of a file differently.
+    """
+    key = json.dumps([file_key(input_file), analyse_config, bool(gpu), decoder, start, end], separators=(',',':'))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def remove_stale_parts(directory):
+    """
+    Deletes the part files left behind by recording processes which died
+    before publishing their store (killed vspipe processes never get to
+    clean up after themselves).
+    """
+    if sys.platform == 'win32': # No cheap way to check for a pid without side effects
+        return
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        pid = name.rsplit('.', 2)[-2] if name.endswith('.part') else ''
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        except OSError: # Alive, owned by someone else
+            pass
+
+def remove_part(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def plane_sizes(fmt, width, height):
+    sizes = []
+    for p in range(fmt.num_planes):
+        w = width >> (fmt.subsampling_w if p > 0 else 0)
+        h = height >> (fmt.subsampling_h if p > 0 else 0)
+        sizes.append((w * fmt.bytes_per_sample, h))
+    return sizes
+
+def copy_plane(dst, dst_stride, src, src_stride, row, height):
+    if dst_stride == src_stride:
+        ctypes.memmove(dst, src, src_stride * (height - 1) + row)
+    else:
+        for y in range(height):
+            ctypes.memmove(dst + y * dst_stride, src + y * src_stride, row)
+
+class VectorStore(object):
+    """
+    Memory-mapped on-disk store for the frames of an svp1.Analyse vectors clip,
+    addressed by the key from vectors_key(). The file holds a JSON header, a
+    completion map and one fixed-size record with the packed planes of every
+    frame. `record()` wraps a vectors clip so computed frames are written to
+    the store and published once all frames are present; `load()` returns a
+    clip that serves the frames from the store instead. Total store size is
+    bounded by `max_bytes` with LRU eviction.
+    """
+    def __init__(self, key, max_bytes=32 * 1024**3):
+        self.__dir = os.path.join(cache_dir(), 'vectors')
+        self.__path = os.path.join(self.__dir, key + '.vec')
+        self.__max_bytes = max_bytes
+        self.__lock = threading.Lock()
+
+    def available(self):
+        return os.path.exists(self.__path)
+
+    def load(self, vs, core):
+        f = open(self.__path, 'r+b')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        f.close()
+        os.utime(self.__path)
+        if mm[:8] != MAGIC:
+            raise ValueError('Invalid vector store: %s' % self.__path)
+        header_len, = struct.unpack('<I', mm[8:12])
+        header = json.loads(mm[12:(12 + header_len)].decode('utf-8'))
+
+        blank = core.std.BlankClip(format=header['format'], width=header['w'], height=header['h'], length=header['n'], fpsnum=header['fps'][0], fpsden=header['fps'][1])
+        sizes = plane_sizes(blank.format, header['w'], header['h'])
+
+        def serve(n, f):
+            fout = f.copy()
+            offset = header['data'] + n * header['frame']
+            for p, (row, height) in enumerate(sizes):
+                src = ctypes.addressof(ctypes.c_char.from_buffer(mm, offset))
+                copy_plane(ptr_value(fout.get_write_ptr(p)), fout.get_stride(p), src, row, row, height)
+                offset += row * height
+            return fout
+
+        return core.std.ModifyFrame(blank, blank, serve)
+
+    def record(self, vs, core, clip):
+        sizes = plane_sizes(clip.format, clip.width, clip.height)
+        frame_size = sum(row * height for row, height in sizes)
+        header = {
+            'format': clip.format.id,
+            'w': clip.width,
+            'h': clip.height,
+            'n': clip.num_frames,
+            'fps': [clip.fps_num, clip.fps_den],
+            'frame': frame_size
+        }
+        header['map'] = align(12 + len(json.dumps(header)) + 64)
+        header['data'] = align(header['map'] + clip.num_frames)
+        header_data = json.dumps(header, separators=(',',':')).encode('utf-8')
+
+        # Only published stores are evicted, part files belong to running jobs
+        remove_stale_parts(self.__dir)
+        evict_lru(self.__dir, max(self.__max_bytes - header['data'] - clip.num_frames * frame_size, 0), '.vec')
+        os.makedirs(self.__dir, exist_ok=True)
+        part = '%s.%d.part' % (self.__path, os.getpid())
+        f = open(part, 'w+b')
+        try:
+            f.truncate(header['data'] + clip.num_frames * frame_size)
+            mm = mmap.mmap(f.fileno(), 0)
+        except:
+            f.close()
+            remove_part(part)
+            raise
+        f.close()
+        # Unless published, the part file goes away with the process (or, if
+        # it is killed, with the next recording in the same directory)
+        atexit.register(remove_part, part)
+        mm[:(12 + len(header_data))] = MAGIC + struct.pack('<I', len(header_data)) + header_data
+        state = {'missing': clip.num_frames}
+
+        def store(n, f):
+            if mm[header['map'] + n] != 0:
+                return f
+            offset = header['data'] + n * frame_size
+            for p, (row, height) in enumerate(sizes):
+                dst = ctypes.addressof(ctypes.c_char.from_buffer(mm, offset))
+                copy_plane(dst, row, ptr_value(f.get_read_ptr(p)), f.get_stride(p), row, height)
+                offset += row * height
+            with self.__lock:
+                if mm[header['map'] + n] != 0:
+                    return f
+                mm[header['map'] + n] = 1
+                state['missing'] -= 1
+                if state['missing'] == 0:
+                    mm.flush()
+                    try:
+                        os.replace(part, self.__path)
+                    except OSError: # Evicted by a concurrent job
+                        pass
+            return f
+
+        return core.std.ModifyFrame(clip, clip, store)
+
+def ptr_value(ptr):
+    return getattr(ptr, 'value', ptr)
@@ -0,0 +1,113 @@
+#
+#  vsengine_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import os, ctypes, threading
+from collections import deque
+from concurrent.futures import Future
+
+__all__ = ['VSFrameWriter', 'rawvideo_options']
+
+PIX_FMTS = {
+    (1, 1, 1): 'yuv420p',
+    (0, 0, 1): 'yuv444p',
+    (1, 0, 1): 'yuv422p',
+}
+
+def rawvideo_options(clip):
+    fmt = clip.format
+    return [
+        '-f', 'rawvideo',
+        '-pix_fmt', PIX_FMTS[(fmt.subsampling_w, fmt.subsampling_h, fmt.bytes_per_sample)],
+        '-s:v', '%dx%d' % (clip.width, clip.height),
+        '-r', '%d/%d' % (clip.fps_num, clip.fps_den)
+    ]
+
+def request_frame(clip, n):
+    try:
+        return clip.get_frame_async(n)
+    except TypeError: # Older API versions require a callback
+        future = Future()
+        def callback(frame, error):
+            if error is None:
+                future.set_result(frame)
+            else:
+                future.set_exception(error)
+        clip.get_frame_async(n, callback)
+        return future
+
+def write_all(fd, data):
+    while len(data) > 0:
+        data = data[os.write(fd, data):]
+
+def write_frame(fd, frame):
+    written = 0
+    fmt = frame.format
+    for p in range(fmt.num_planes):
+        width = frame.width >> (fmt.subsampling_w if p > 0 else 0)
+        height = frame.height >> (fmt.subsampling_h if p > 0 else 0)
+        row = width * fmt.bytes_per_sample
+        stride = frame.get_stride(p)
+        ptr = frame.get_read_ptr(p)
+        plane = memoryview((ctypes.c_ubyte * (stride * (height - 1) + row)).from_address(getattr(ptr, 'value', ptr))).cast('B')
+        if stride == row:
+            write_all(fd, plane)
+        else:
+            for y in range(height):
+                write_all(fd, plane[(y * stride):(y * stride + row)])
+        written += row * height
+    return written
+
+class VSFrameWriter(threading.Thread):
+    """
+    Renders a VapourSynth clip in the current process and writes the raw
+    planes of every frame straight from the frame buffers to the given file
+    (usually an encoder's stdin), keeping up to `prefetch` frame requests in
+    flight. Closes the file when done. Mimics the `wait()` and `returncode`
+    interface of a Popen object so it can stand in for vspipe. The number of
+    bytes written so far is available as `bytes_written`.
+    """
+    def __init__(self, clip, f, prefetch=0):
+        threading.Thread.__init__(self, daemon=True)
+        self.__clip = clip
+        self.__f = f
+        self.__prefetch = prefetch if prefetch > 0 else (os.cpu_count() or 1)
+        self.returncode = None
+        self.error = None
+        self.bytes_written = 0
+
+    def run(self):
+        clip = self.__clip
+        fd = self.__f.fileno()
+        pending = deque()
+        n = 0
+        try:
+            while n < clip.num_frames or len(pending) > 0:
+                while n < clip.num_frames and len(pending) < self.__prefetch:
+                    pending.append(request_frame(clip, n))
+                    n += 1
+                self.bytes_written += write_frame(fd, pending.popleft().result())
+            self.returncode = 0
+        except BrokenPipeError:
+            self.returncode = 1
+        except Exception as e:
+            self.error = e
+            self.returncode = 1
+        finally:
+            pending.clear()
+            # Lets the graph (and the decoders feeding it) go while the caller still holds on to this thread
+            self.__clip = None
+            try:
+                self.__f.close()
+            except OSError:
+                pass
+
+    def wait(self):
+        self.join()
+        return self.returncode
@@ -26,13 +26,33 @@ def build_svp_config(config):
     else:
         return str(config)
 
-def vspipe(config, **kwargs):
+def vspipe(config, segment=None, overlap=0, mvcache=None, index_cache=None, threads=None, cache=None, **kwargs):
     cmd = ['vspipe', '--arg', 'source=' + config.input_file]
 
-    cmd.extend(['--arg', 'analyse=' + build_svp_config(config.profile['analyse'])])
-    cmd.extend(['--arg', 'smooth=' + build_svp_config(config.profile['smooth'])])
+    compiled = config.profile.get('compiled')
+    if compiled is not None:
+        cmd.extend(['--arg', 'analyse=' + compiled['analyse'], '--arg', 'smooth=' + compiled['smooth']])
+    else:
+        cmd.extend(['--arg', 'analyse=' + build_svp_config(config.profile['analyse'])])
+        cmd.extend(['--arg', 'smooth=' + build_svp_config(config.profile['smooth'])])
     if config.gpu:
         cmd.extend(['--arg', 'gpu=1'])
+    if config.decoder != 'ffms2':
+        cmd.extend(['--arg', 'decoder=' + config.decoder])
+    if config.dedup_file is not None:
+        cmd.extend(['--arg', 'dedup=' + config.dedup_file])
+    if segment is not None:
+        cmd.extend(['--arg', 'first=%d' % segment[0], '--arg', 'overlap=%d' % overlap])
+        if segment[1] is not None:
+            cmd.extend(['--arg', 'last=%d' % segment[1]])
+    if mvcache is not None:
+        cmd.extend(['--arg', 'mvcache=' + mvcache])
+    if index_cache is not None:
+        cmd.extend(['--arg', 'indexcache=' + index_cache[0], '--arg', 'indexcachesize=%d' % index_cache[1]])
+    if threads is not None:
+        cmd.extend(['--arg', 'threads=%d' % threads])
+    if cache is not None:
+        cmd.extend(['--arg', 'cachesize=%d' % cache])
     cmd.extend(['--y4m', 'interpolate.py', '-'])
 
     return subprocess.Popen(cmd, **kwargs)
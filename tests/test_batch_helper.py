@@ -0,0 +1,34 @@
+#
+#  test_batch_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.batch_helper import check_entry
+
+class CheckEntryTest(unittest.TestCase):
+    def test_valid(self):
+        check_entry({'id': 'a', 'input': 'in.mkv', 'output': 'out.mkv', 'profile': 'anime', 'override': {'v_bitrate': 4000},
+            'gpu': True, 'inline_subtitles': False, 'renditions': [{'output': 'low.mkv', 'profile': 'low'}]})
+
+    def test_missing_keys(self):
+        for entry in [{'input': 'in.mkv'}, {'output': 'out.mkv'}, ['in.mkv', 'out.mkv']]:
+            self.assertRaises(ValueError, check_entry, entry)
+
+    def test_unknown_key(self):
+        self.assertRaises(ValueError, check_entry, {'input': 'in.mkv', 'output': 'out.mkv', 'profil': 'anime'})
+
+    def test_types(self):
+        for key, value in [('profile', 1), ('override', 'fast'), ('gpu', 'yes'), ('inline_subtitles', 1), ('logo', None), ('subtitles', ['a.ass']), ('input', 5)]:
+            entry = {'input': 'in.mkv', 'output': 'out.mkv'}
+            entry[key] = value
+            self.assertRaises(ValueError, check_entry, entry)
+
+    def test_renditions(self):
+        for renditions in [{'output': 'low.mkv'}, [{'profile': 'low'}], [{'output': 'low.mkv', 'profile': 2}], ['low.mkv']]:
+            self.assertRaises(ValueError, check_entry, {'input': 'in.mkv', 'output': 'out.mkv', 'renditions': renditions})
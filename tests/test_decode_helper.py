@@ -0,0 +1,95 @@
+#
+#  test_decode_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import gc, sys, unittest, subprocess
+from lib.decode_helper import FrameReader, select_decoder
+
+# Stands in for ffdecode(): one-byte frames holding their number, a stream
+# starting at 1s and seeks landing on the keyframe (every 10th frame) before
+DECODER = r'''
+import sys
+start, count, missing = float(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+first = 0 if start < 0 else int(start * 25) // 10 * 10
+sys.stderr.write('Input #0, matroska,webm, from \'input.mkv\':\n')
+for n in range(first, count):
+    if n == missing:
+        continue
+    sys.stderr.write('[Parsed_showinfo_0 @ 0x5581c0] n:%4d pts:%7d pts_time:%-7s duration:40\n' % (n - first, 1000 + n * 40, 1 + n / 25))
+    sys.stderr.flush()
+    sys.stdout.buffer.write(bytes([n]))
+    sys.stdout.flush()
+'''
+
+def reader(count=100, missing=-1, window=8, started=None):
+    def start_decoder(start):
+        p = subprocess.Popen([sys.executable, '-c', DECODER, str(start if start is not None else -1), str(count), str(missing)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if started is not None:
+            started.append(p)
+        return p
+    return FrameReader(start_decoder, 1, [25, 1], window, 1.0)
+
+class FrameReaderTest(unittest.TestCase):
+    def test_sequential(self):
+        r = reader()
+        try:
+            self.assertEqual([r.get(n)[0] for n in range(20)], list(range(20)))
+        finally:
+            r.close()
+
+    def test_seek(self):
+        r = reader()
+        try:
+            # Both land in the middle of a GOP, and then go backwards
+            self.assertEqual(r.get(57)[0], 57)
+            self.assertEqual(r.get(33)[0], 33)
+            self.assertEqual(r.get(34)[0], 34)
+        finally:
+            r.close()
+
+    def test_missing_frame(self):
+        r = reader(missing=5)
+        try:
+            self.assertEqual([r.get(n)[0] for n in range(3, 8)], [3, 4, 4, 6, 7])
+        finally:
+            r.close()
+
+    def test_past_end(self):
+        r = reader(count=10)
+        try:
+            self.assertEqual(r.get(12)[0], 9)
+        finally:
+            r.close()
+
+    def test_close(self):
+        started = []
+        r = reader(started=started)
+        r.get(3)
+        r.close()
+        self.assertIsNotNone(started[0].returncode)
+        # Reopens on the next request
+        self.assertEqual(r.get(4)[0], 4)
+        r.close()
+
+    def test_collected(self):
+        started = []
+        r = reader(started=started)
+        r.get(3)
+        del r
+        gc.collect()
+        self.assertIsNotNone(started[0].returncode)
+
+class SelectDecoderTest(unittest.TestCase):
+    def test_vfr(self):
+        info = {'w': 3840, 'h': 2160, 'nf': 100, 'c': 'hevc', 'vfr': True}
+        self.assertEqual(select_decoder('ffmpeg', 'input.mkv', info, []), 'ffms2')
+
+    def test_heavy(self):
+        info = {'w': 3840, 'h': 2160, 'nf': 100, 'c': 'hevc', 'vfr': False}
+        self.assertEqual(select_decoder('auto', 'input.mkv', info, []), 'ffmpeg')
@@ -0,0 +1,45 @@
+#
+#  test_dedup_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.dedup_helper import frame_map, held_frame, held_fraction
+
+class FrameMapTest(unittest.TestCase):
+    def test_runs(self):
+        self.assertEqual(frame_map([[2, 3], [5, 5]], 7), bytearray([0, 0, 1, 1, 0, 1, 0]))
+
+    def test_run_past_end(self):
+        # ffprobe's frame count may be short of what the filter graph saw
+        self.assertEqual(frame_map([[3, 9]], 5), bytearray([0, 0, 0, 1, 1]))
+
+    def test_no_runs(self):
+        self.assertEqual(frame_map([], 3), bytearray(3))
+
+class HeldFrameTest(unittest.TestCase):
+    def test_doubling(self):
+        dup = frame_map([[2, 2]], 4) # Frame 2 repeats frame 1
+        self.assertEqual([held_frame(dup, n, 2, 1) for n in range(8)], [None, None, None, 1, None, None, None, None])
+
+    def test_24_to_60(self):
+        dup = frame_map([[1, 1]], 3)
+        # 5 output frames per 2 source frames; output frames 1 and 2 lie between source frames 0 and 1
+        self.assertEqual([held_frame(dup, n, 5, 2) for n in range(5)], [None, 0, 0, None, None])
+
+    def test_last_frame(self):
+        dup = frame_map([[1, 1]], 2)
+        self.assertIsNone(held_frame(dup, 3, 2, 1))
+
+class HeldFractionTest(unittest.TestCase):
+    def test_fraction(self):
+        dup = frame_map([[1, 1], [3, 3]], 4)
+        self.assertEqual(held_fraction(dup, 2, 1), 0.25)
+
+    def test_empty(self):
+        self.assertEqual(held_fraction(bytearray(), 2, 1), 0.0)
@@ -0,0 +1,53 @@
+#
+#  test_memory_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.memory_helper import MiB, parse_size, frame_bytes, plan_memory
+
+FB = frame_bytes(1920, 1080)
+X264 = [(12, 40, 6)]
+
+class ParseSizeTest(unittest.TestCase):
+    def test_suffixes(self):
+        self.assertEqual(parse_size('6G'), 6 * 1024**3)
+        self.assertEqual(parse_size('512m'), 512 * MiB)
+        self.assertEqual(parse_size('1.5GB'), 1536 * MiB)
+        self.assertEqual(parse_size('4096'), 4096)
+
+class FrameBytesTest(unittest.TestCase):
+    def test_depth(self):
+        self.assertEqual(frame_bytes(1920, 1080), 3110400)
+        self.assertEqual(frame_bytes(1920, 1080, 10), 6220800)
+
+class PlanMemoryTest(unittest.TestCase):
+    def test_plenty(self):
+        plan = plan_memory(64 * 1024**3, FB, 8, X264)
+        self.assertEqual((plan['cache'], plan['queue'], plan['la']), (4096, 16, 40))
+        self.assertLess(plan['est'], 64 * 1024**3)
+
+    def test_budget_used_up(self):
+        plan = plan_memory(2 * 1024**3, FB, 8, X264)
+        self.assertEqual((plan['queue'], plan['la']), (16, 40))
+        self.assertEqual(plan['est'], 2 * 1024**3)
+
+    def test_queue_then_lookahead(self):
+        budgets = [1500 * MiB, 1400 * MiB, 1250 * MiB]
+        plans = [plan_memory(budget, FB, 8, X264) for budget in budgets]
+        for budget, plan in zip(budgets, plans):
+            self.assertGreaterEqual(plan['cache'], 128)
+            self.assertLessEqual(plan['est'], budget)
+        self.assertEqual([(plan['queue'], plan['la']) for plan in plans], [(8, 40), (4, 20), (4, 10)])
+
+    def test_too_small(self):
+        self.assertIsNone(plan_memory(1024 * MiB, FB, 8, X264))
+
+    def test_longest_lookahead(self):
+        plan = plan_memory(64 * 1024**3, FB, 8, X264 + [(12, 60, 6)])
+        self.assertEqual(plan['la'], 60)
@@ -0,0 +1,42 @@
+#
+#  test_proc_follow.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.proc_follow import LineSplitter
+
+def split(*chunks):
+    splitter = LineSplitter()
+    lines = []
+    for chunk in chunks:
+        splitter.feed(chunk)
+        lines.extend(splitter)
+    return lines
+
+class LineSplitterTest(unittest.TestCase):
+    def test_separators(self):
+        self.assertEqual(split(b'a\nb\r\nc\rd\n'), [b'a', b'b', b'c', b'd'])
+
+    def test_crlf_across_chunks(self):
+        self.assertEqual(split(b'a\r', b'\nb\n'), [b'a', b'b'])
+
+    def test_cr_at_end_of_chunk(self):
+        self.assertEqual(split(b'a\r', b'b\r', b'c\n'), [b'a', b'b', b'c'])
+
+    def test_partial_line(self):
+        self.assertEqual(split(b'ab', b'c', b'\nd'), [b'abc'])
+
+    def test_empty_lines(self):
+        self.assertEqual(split(b'\n\r\n', b'\n'), [b'', b'', b''])
+
+    def test_long_stream(self):
+        # Enough data to make the splitter compact its buffer
+        lines = split(*([b'frame=1\r\n' * 1000] * 20))
+        self.assertEqual(len(lines), 20000)
+        self.assertEqual(set(lines), {b'frame=1'})
@@ -0,0 +1,83 @@
+#
+#  test_progress_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.progress_helper import ProgressParser, ProgressReporter
+
+BLOCK = [
+    b'frame=120', b'fps=24.50', b'stream_0_0_q=28.0', b'bitrate=1677.7kbits/s',
+    b'total_size=1048576', b'out_time_us=5000000', b'out_time=00:00:05.000000',
+    b'dup_frames=1', b'drop_frames=0', b'speed=1.02x', b'progress=continue'
+]
+
+class ProgressParserTest(unittest.TestCase):
+    def test_block(self):
+        parser = ProgressParser()
+        results = [parser.feed(line) for line in BLOCK]
+        self.assertEqual(results[:-1], [None] * (len(BLOCK) - 1))
+        self.assertEqual(results[-1], {
+            'f': 120, 'fps': 24.5, 'q': 28.0, 'sz': '1024kB', 't': 5.0,
+            'br': '1677.7kbits/s', 'spd': '1.02x', 'dup': 1, 'drop': 0
+        })
+
+    def test_not_available(self):
+        parser = ProgressParser()
+        for line in [b'frame=0', b'total_size=N/A', b'out_time_us=N/A', b'bitrate=N/A']:
+            parser.feed(line)
+        progress = parser.feed(b'progress=continue')
+        self.assertEqual((progress['sz'], progress['t'], progress['br']), ('N/A', None, 'N/A'))
+
+    def test_log_lines(self):
+        parser = ProgressParser()
+        self.assertIsNone(parser.feed(b'[libx264 @ 0x55d0c8a4a2c0] using cpu capabilities: MMX2 SSE2Fast'))
+
+    def test_blocks_are_separate(self):
+        parser = ProgressParser()
+        for line in BLOCK:
+            parser.feed(line)
+        self.assertEqual(parser.feed(b'progress=end')['f'], 0)
+
+class ProgressReporterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.emitted = []
+        self.reporter = ProgressReporter({'nft': 96}, lambda info: self.emitted.append(dict(info)), 1.0, clock=lambda: self.now)
+
+    def update(self, now, frame):
+        self.now = now
+        self.reporter.update({'f': frame})
+
+    def test_rate_limit(self):
+        self.update(0.0, 0)
+        self.update(0.5, 24)
+        self.assertEqual([e['f'] for e in self.emitted], [0])
+        self.update(1.0, 48)
+        self.assertEqual([e['f'] for e in self.emitted], [0, 48])
+
+    def test_rate_and_eta(self):
+        self.update(0.0, 0)
+        self.update(0.5, 24)
+        self.update(1.0, 48)
+        self.assertEqual(self.emitted[-1]['sfps'], 48.0)
+        self.assertEqual(self.emitted[-1]['eta'], 1.0)
+
+    def test_smoothing(self):
+        self.update(0.0, 0)
+        self.update(1.0, 48)
+        self.update(2.0, 58)
+        self.assertEqual(self.emitted[-1]['sfps'], 36.6) # 48 + 0.3 * (10 - 48)
+
+    def test_flush(self):
+        self.update(0.0, 0)
+        self.update(0.5, 24)
+        self.reporter.flush()
+        self.assertEqual([e['f'] for e in self.emitted], [0, 24])
+        self.reporter.flush() # Nothing pending
+        self.assertEqual(len(self.emitted), 2)
@@ -0,0 +1,32 @@
+#
+#  test_segment_helper.py
+#  dSVP
+#
+#  Created by the dSVP contributors on 18.10.26.
+#  Copyright (c) 2026 the dSVP contributors
+#
+#  Licensed under the EUPL
+#
+
+import unittest
+from lib.segment_helper import plan_segments
+
+class PlanSegmentsTest(unittest.TestCase):
+    def test_even_keyframes(self):
+        self.assertEqual(plan_segments([0, 25, 50, 75], 100, 4), [(0, 25), (25, 50), (50, 75), (75, 100)])
+
+    def test_closest_keyframe(self):
+        self.assertEqual(plan_segments([0, 30, 60, 90], 100, 2), [(0, 60), (60, 100)])
+
+    def test_no_keyframes(self):
+        self.assertEqual(plan_segments([], 100, 4), [(0, 100)])
+
+    def test_fewer_keyframes_than_segments(self):
+        self.assertEqual(plan_segments([0, 40], 100, 4), [(0, 40), (40, 100)])
+
+    def test_min_frames(self):
+        # A segment of 5 frames would cost more in startup than it saves
+        self.assertEqual(plan_segments([0, 95], 100, 2, 10), [(0, 100)])
+
+    def test_float_frame_count(self):
+        self.assertEqual(plan_segments([0, 50], 100.0, 2), [(0, 50), (50, 100)])